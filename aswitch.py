@@ -1,16 +1,121 @@
 # aswitch.py Switch and pushbutton classes for asyncio
 # Delay_ms A retriggerable delay class. Can schedule a coro on timeout.
+# TimerWheel Services all Delay_ms instances from a single coro.
 # Switch Simple debounced switch class for normally open grounded switch.
 # Pushbutton extend the above to support logical state, long press and
 # double-click events
+# SwitchBank Polls many Switch and Pushbutton instances from one thread
+# Switch and Pushbutton may instead be driven by pin change interrupts
 # Tested on Pyboard but should run on other microcontroller platforms
-# running MicroPython and uasyncio.
+# running MicroPython and uasyncio. Runs under CPython with simulated pins:
+# see switchtest.py.
 # Author: Peter Hinch.
 # Copyright Peter Hinch 2016 Released under the MIT license.
 
-import uasyncio as asyncio
-from asyn import launch
+try:
+    import uasyncio as asyncio
+    async_sleep_ms = asyncio.sleep_ms
+except ImportError:  # CPython
+    import asyncio
+    def async_sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:  # Wrap as MicroPython does so that ticks fit an array('I')
+    from time import time
+    def ticks_ms():
+        return int(time() * 1000) & 0x3fffffff
+    def ticks_diff(a, b):
+        return ((a - b + 0x20000000) & 0x3fffffff) - 0x20000000
+from array import array
+from asyn import launch, create_task, Event
 # launch: run a callback or initiate a coroutine depending on which is passed.
+try:
+    import stm  # Enables single-access port reads in SwitchBank
+except ImportError:
+    stm = None
+try:
+    from micropython import schedule
+except ImportError:  # Simulation on a PC: run the callback directly
+    def schedule(func, arg):
+        func(arg)
+
+# All pending Delay_ms deadlines are held by a single hashed timer wheel which
+# is serviced by one coro. Starting, retriggering or stopping a delay is O(1)
+# and creates no task. Entries are examined lazily: a retriggered timer stays
+# in its slot and is moved on when that slot is reached; a stopped timer is
+# discarded. Delays beyond the wheel's horizon are re-examined each revolution.
+# When no delays are pending the coro waits on an Event and costs nothing.
+class TimerWheel(object):
+    tick_ms = 10  # Resolution
+    nslots = 32
+    _instance = None
+
+    @classmethod
+    def get(cls):  # Singleton, created on first use
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._slots = [[] for _ in range(self.nslots)]
+        self._spare = []
+        self._tick = 0  # Ticks since instantiation
+        self._entries = 0
+        self._wake = Event()
+        create_task(self._run(), 'TimerWheel')
+
+    def ticks(self, ms):  # Deadline in ticks for a duration from now. May be up to one tick late, never early.
+        return self._tick + (ms + self.tick_ms - 1) // self.tick_ms + 1
+
+    def insert(self, timer):
+        tick = min(timer._deadline, self._tick + self.nslots - 1)
+        tick = max(tick, self._tick + 1)
+        due = timer._due
+        if due is not None and due <= tick:
+            return  # Already in a slot which will be reached in time
+        timer._due = tick
+        self._slots[tick % self.nslots].append(timer)
+        self._entries += 1
+        if not self._wake.is_set():
+            self._wake.set()
+
+    def _advance(self):
+        self._tick += 1
+        t = self._tick
+        idx = t % self.nslots
+        todo = self._slots[idx]
+        if not todo:
+            return
+        self._slots[idx] = self._spare
+        for timer in todo:
+            self._entries -= 1
+            if timer._due != t:  # Stale: timer was moved to an earlier slot
+                continue
+            timer._due = None
+            if not timer._running:  # Stopped
+                continue
+            if timer._deadline > t:  # Retriggered or beyond horizon
+                self.insert(timer)
+            else:
+                timer._running = False
+                timer._expire()
+        del todo[:]
+        self._spare = todo
+
+    async def _run(self):
+        while True:
+            if not self._entries:
+                self._wake.clear()
+                await self._wake  # Wait for a timer to be started
+            last = ticks_ms()
+            while self._entries:
+                await async_sleep_ms(self.tick_ms)
+                now = ticks_ms()
+                n = ticks_diff(now, last) // self.tick_ms
+                last += n * self.tick_ms  # Retain the remainder
+                for _ in range(n):
+                    self._advance()
 
 
 class Delay_ms(object):
@@ -18,40 +123,86 @@ class Delay_ms(object):
         self.func = func
         self.args = args
         self._running = False
+        self._deadline = 0
+        self._due = None  # Tick of timer wheel slot holding this instance
 
     def stop(self):
         self._running = False
 
     def trigger(self, duration):  # Update end time
-        loop = asyncio.get_event_loop()
-        self.tstop = loop.time() + duration
-        if not self._running:
-            # Start a thread which stops the delay after its period has elapsed
-            loop.create_task(self.killer())
-            self._running = True
+        wheel = TimerWheel.get()
+        self._deadline = wheel.ticks(duration)
+        self._running = True
+        wheel.insert(self)
 
     def running(self):
         return self._running
 
-    async def killer(self):
-        loop = asyncio.get_event_loop()
-        while self.tstop > loop.time():
-            # Must loop here: might be retriggered
-            await asyncio.sleep_ms(self.tstop - loop.time())
-        if self._running and self.func is not None:
+    def _expire(self):
+        if self.func is not None:
             launch(self.func, self.args)  # Execute callback
-        self._running = False
+
+
+# Interrupt mode. The pin's IRQ handler stores a timestamp for each edge in a
+# preallocated ring buffer and uses micropython.schedule to set an Event. The
+# coro waits on the Event so costs nothing while the pin is idle. On the first
+# edge the state is acted on at once, then the coro waits until no edge has
+# occurred for debounce_ms and checks the settled state. The pin may be any
+# object with value() and irq() methods so the logic can be tested with a
+# simulated pin.
+class _PinEdges(object):
+    def __init__(self, pin, check, debounce_ms, nedges=8):
+        self._stamps = array('I', (0 for _ in range(nedges)))
+        self._idx = 0
+        self._pending = False
+        self._event = Event()
+        self._scheduled = self._wake  # Bound method is allocated here, not in ISR
+        self.pin = pin
+        self.check = check
+        self.debounce_ms = debounce_ms
+        pin.irq(handler = self._isr, trigger = pin.IRQ_FALLING | pin.IRQ_RISING)
+        create_task(self._run(), 'PinEdges')  # Thread runs forever
+
+    def _isr(self, pin):  # Must not allocate
+        self._idx = (self._idx + 1) % len(self._stamps)
+        self._stamps[self._idx] = ticks_ms()
+        if not self._pending:  # Avoid filling the schedule queue with bounces
+            self._pending = True
+            schedule(self._scheduled, None)
+
+    def _wake(self, _):
+        self._pending = False
+        self._event.set()
+
+    def last_edge(self):  # ticks_ms() value of most recent edge
+        return self._stamps[self._idx]
+
+    async def _run(self):
+        event = self._event
+        while True:
+            await event
+            event.clear()
+            self.check(self.pin.value())  # Act on the change now
+            # Wait for contact bounce to cease
+            while ticks_diff(ticks_ms(), self.last_edge()) < self.debounce_ms:
+                await async_sleep_ms(self.debounce_ms)
+            event.clear()
+            self.check(self.pin.value())  # Settled state may differ
 
 
 class Switch(object):
     debounce_ms = 50
-    def __init__(self, pin):
+    def __init__(self, pin, bank=None, irq=False):
         self.pin = pin # Should be initialised for input with pullup
         self._open_func = False
         self._close_func = False
         self.switchstate = self.pin.value()  # Get initial state
-        loop = asyncio.get_event_loop()
-        loop.create_task(self.switchcheck())  # Thread runs forever
+        if irq:
+            self._edges = _PinEdges(pin, self._check, Switch.debounce_ms)
+        elif bank is None:
+            create_task(self.switchcheck(), 'Switch')  # Thread runs forever
+        else:
+            bank.add(self)  # Polled by the SwitchBank thread
 
     def open_func(self, func, args=()):
         self._open_func = func
@@ -65,34 +216,41 @@ class Switch(object):
     def __call__(self):
         return self.switchstate
 
+    def _check(self, state):
+        if state != self.switchstate:
+            # State has changed: act on it now.
+            self.switchstate = state
+            if state == 0 and self._close_func:
+                launch(self._close_func, self._close_args)
+            elif state == 1 and self._open_func:
+                launch(self._open_func, self._open_args)
+
     async def switchcheck(self):
-        loop = asyncio.get_event_loop()
         while True:
-            state = self.pin.value()
-            if state != self.switchstate:
-                # State has changed: act on it now.
-                self.switchstate = state
-                if state == 0 and self.close_func:
-                    launch(self._close_func, self._close_args)
-                elif state == 1 and self._open_func:
-                    launch(self._open_func, self._open_args)
+            self._check(self.pin.value())
             # Ignore further state changes until switch has settled
-            await asyncio.sleep_ms(Switch.debounce_ms)
+            await async_sleep_ms(Switch.debounce_ms)
 
 class Pushbutton(object):
     debounce_ms = 50
     long_press_ms = 1000
     double_click_ms = 400
-    def __init__(self, pin):
+    def __init__(self, pin, bank=None, irq=False):
         self.pin = pin # Initialise for input
         self._true_func = False
         self._false_func = False
         self._double_func = False
         self._long_func = False
+        self._longdelay = None
+        self._doubledelay = None
         self.sense = pin.value()  # Convert from electrical to logical value
         self.buttonstate = self.rawstate()  # Initial state
-        loop = asyncio.get_event_loop()
-        loop.create_task(self.buttoncheck())  # Thread runs forever
+        if irq:
+            self._edges = _PinEdges(pin, self._check, Pushbutton.debounce_ms)
+        elif bank is None:
+            create_task(self.buttoncheck(), 'Pushbutton')  # Thread runs forever
+        else:
+            bank.add(self)  # Polled by the SwitchBank thread
 
     def press_func(self, func, args=()):
         self._true_func = func
@@ -118,36 +276,97 @@ class Pushbutton(object):
     def __call__(self):
         return self.buttonstate
 
+    # Process a sample of the electrical pin state
+    def _check(self, value):
+        state = bool(value ^ self.sense)
+        if state == self.buttonstate:
+            return
+        # State has changed: act on it now.
+        self.buttonstate = state
+        if self._long_func and self._longdelay is None:
+            self._longdelay = Delay_ms(self._long_func, self._long_args)
+        if self._double_func and self._doubledelay is None:
+            self._doubledelay = Delay_ms()
+        longdelay = self._longdelay
+        doubledelay = self._doubledelay
+        if state:
+            # Button is pressed
+            if self._long_func and not longdelay.running():
+                # Start long press delay
+                longdelay.trigger(Pushbutton.long_press_ms)
+            if self._double_func:
+                if doubledelay.running():
+                    launch(self._double_func, self._double_args)
+                else:
+                    # First click: start doubleclick timer
+                    doubledelay.trigger(Pushbutton.double_click_ms)
+            if self._true_func:
+                launch(self._true_func, self._true_args)
+        else:
+            # Button release
+            if self._long_func and longdelay.running():
+                # Avoid interpreting a second click as a long push
+                longdelay.stop()
+            if self._false_func:
+                launch(self._false_func, self._false_args)
+
     async def buttoncheck(self):
-        loop = asyncio.get_event_loop()
-        if self._long_func:
-            longdelay = Delay_ms(self._long_func, self._long_args)
-        if self._double_func:
-            doubledelay = Delay_ms()
         while True:
-            state = self.rawstate()
-            # State has changed: act on it now.
-            if state != self.buttonstate:
-                self.buttonstate = state
-                if state:
-                    # Button is pressed
-                    if self._long_func and not longdelay.running():
-                        # Start long press delay
-                        longdelay.trigger(Pushbutton.long_press_ms)
-                    if self._double_func:
-                        if doubledelay.running():
-                            launch(self._double_func, self._double_args)
-                        else:
-                            # First click: start doubleclick timer
-                            doubledelay.trigger(Pushbutton.double_click_ms)
-                    if self._true_func:
-                        launch(self._true_func, self._true_args)
-                else:
-                    # Button release
-                    if self._long_func and longdelay.running():
-                        # Avoid interpreting a second click as a long push
-                        longdelay.stop()
-                    if self._false_func:
-                        launch(self._false_func, self._false_args)
+            self._check(self.pin.value())
             # Ignore state changes until switch has settled
-            await asyncio.sleep_ms(Pushbutton.debounce_ms)
+            await async_sleep_ms(Pushbutton.debounce_ms)
+
+# A SwitchBank polls any number of Switch and Pushbutton instances from a
+# single thread. Pass the bank to their constructors:
+# bank = SwitchBank()
+# sw = Switch(pyb.Pin('X1', pyb.Pin.IN, pyb.Pin.PULL_UP), bank)
+# If all pins are on the same GPIO port, the port's input register is read in
+# a single access, otherwise pins are read individually. Pin states are held
+# as bits in an integer: only instances whose bit has changed are processed.
+class SwitchBank(object):
+    debounce_ms = 50
+    def __init__(self):
+        self._members = []
+        self._gpio = None  # Port base address if all pins share one port
+        self._mask = 0  # Bits in use
+        self._state = 0
+        create_task(self._scan(), 'SwitchBank')  # Thread runs forever
+
+    def add(self, member):  # Called by Switch and Pushbutton constructors
+        self._members.append(member)
+        gpio = None
+        if stm is not None:
+            try:
+                ports = {m.pin.gpio() for m in self._members}
+            except AttributeError:  # Not a pyb.Pin
+                pass
+            else:
+                if len(ports) == 1:
+                    gpio = ports.pop()
+        self._gpio = gpio
+        self._mask = 0
+        for n, m in enumerate(self._members):
+            m._bankmask = 1 << (m.pin.pin() if gpio is not None else n)
+            self._mask |= m._bankmask
+        self._state = self._read()
+
+    def _read(self):
+        if self._gpio is not None:
+            return stm.mem16[self._gpio + stm.GPIO_IDR]
+        word = 0
+        for m in self._members:
+            if m.pin.value():
+                word |= m._bankmask
+        return word
+
+    async def _scan(self):
+        while True:
+            raw = self._read()
+            changed = (raw ^ self._state) & self._mask
+            if changed:
+                self._state = raw
+                for m in self._members:
+                    if changed & m._bankmask:
+                        m._check(1 if raw & m._bankmask else 0)
+            # Ignore further state changes until switches have settled
+            await async_sleep_ms(self.debounce_ms)
@@ -2,27 +2,195 @@
 # Author: Peter Hinch
 # Copyright Peter Hinch 2016 Released under the MIT license
 # Test/demo programs asyntest.py, barrier_test.py
-# Provides Lock, Event and Barrier classes and launch function
+# Provides Lock, Event, Barrier, Semaphore and Queue classes, launch and
+# create_task functions and a Profiler class
 
 # CPython 3.5 compatibility
 # (ignore RuntimeWarning: coroutine '_g' was never awaited)
 try:
     import uasyncio as asyncio
+    _cpython = False
 except ImportError:
     import asyncio
+    _cpython = True
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import time
+    def ticks_us():
+        return int(time() * 1000000)
+    def ticks_diff(a, b):
+        return a - b
 
 async def _g():
     pass
 type_coro = type(_g())
 
+# Wait queues. Rather than polling, a waiting coro is parked: it is removed
+# from the scheduler and only rescheduled when another coro wakes it. This
+# avoids every waiter being run on every pass of the event loop.
+# Under uasyncio yielding False tells the scheduler not to reschedule the
+# current task. Under CPython a Future stands in for the parked task.
+# A task cancelled while parked removes itself from the queue. If it had
+# already been woken, whatever it was woken for is passed on by calling
+# woken(), otherwise the wakeup would be lost with the task.
+def _park(waiting, woken=None):
+    loop = asyncio.get_event_loop()
+    task = loop.create_future() if _cpython else loop.cur_task
+    waiting.append(task)
+    try:
+        if _cpython:
+            yield from task
+        else:
+            yield False
+    except BaseException:
+        if task in waiting:
+            waiting.remove(task)
+        elif woken is not None:
+            woken()
+        raise
+
+if _cpython:
+    import types
+    _park = types.coroutine(_park)
+
+# Wake the task at the head of a wait queue. Waiters cancelled but not yet
+# removed are discarded. Return False if there was no live waiter: the caller
+# then keeps the resource it was handing over.
+def _wake(waiting):
+    while waiting:
+        task = waiting.pop(0)
+        if _cpython:
+            if task.done():  # Cancelled
+                continue
+            task.set_result(None)
+        else:
+            asyncio.get_event_loop().call_soon(task)
+        return True
+    return False
+
+def _wake_all(waiting):
+    while waiting:
+        _wake(waiting)
+
 # If a callback is passed, run it and return.
 # If a coro is passed initiate it and return.
 # coros are passed by name i.e. not using function call syntax.
 def launch(func, tup_args):
     res = func(*tup_args)
     if isinstance(res, type_coro):
+        create_task(res, getattr(func, '__name__', 'launch'))
+
+# Schedule a coro. If a Profiler has been instantiated the coro is profiled
+# under the given name. ugui, aswitch and the touch drivers start their threads
+# with this function.
+_profiler = None
+def create_task(coro, name=None):
+    loop = asyncio.get_event_loop()
+    if _profiler is None:
+        loop.create_task(coro)
+    else:
+        loop.create_task(_profiler.wrap(coro, name))
+
+# Per task CPU accounting. Instantiate before creating the GUI: coros started
+# by create_task are then wrapped by a generator which times every resumption.
+# Tasks of the same name share a record. Every period_ms the load of each task
+# and the loop idle percentage over the period are computed. Time spent in the
+# scheduler and in coros started by other means counts as idle.
+# tasks: {name: [total us, resumes, max us, us this period, us last period]}
+class Profiler():
+    def __init__(self, period_ms=1000):
+        global _profiler
+        self.period_ms = period_ms
+        self.tasks = {}
+        self.idle = 100 # Loop idle % during last period
+        self.elapsed_ms = 0 # Since instantiation or reset
+        self._busy = 0 # us this period
+        self._tperiod = ticks_us()
+        _profiler = self
         loop = asyncio.get_event_loop()
-        loop.create_task(res)
+        loop.create_task(self._tick()) # Not profiled
+
+    def wrap(self, coro, name=None):
+        if name is None:
+            name = 'task'
+        rec = self.tasks.get(name)
+        if rec is None:
+            rec = [0, 0, 0, 0, 0]
+            self.tasks[name] = rec
+        return self._run(coro, rec)
+
+    # Resume the wrapped coro with the value or exception passed to the wrapper
+    # by the scheduler, and pass back whatever it yields.
+    def _run(self, coro, rec):
+        value = None
+        exc = None
+        while True:
+            start = ticks_us()
+            try:
+                if exc is None:
+                    req = coro.send(value)
+                else:
+                    req = coro.throw(exc)
+            except StopIteration as e:
+                return e.value
+            finally:
+                dt = ticks_diff(ticks_us(), start)
+                rec[0] += dt
+                rec[1] += 1
+                rec[3] += dt
+                if dt > rec[2]:
+                    rec[2] = dt
+                self._busy += dt
+            value = None
+            exc = None
+            try:
+                value = yield req
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e: # Thrown by the scheduler e.g. cancellation
+                exc = e
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.period_ms / 1000)
+            now = ticks_us()
+            dt = max(ticks_diff(now, self._tperiod), 1)
+            self._tperiod = now
+            self.elapsed_ms += dt // 1000
+            self.idle = max(100 - self._busy * 100 // dt, 0)
+            self._busy = 0
+            for rec in self.tasks.values():
+                rec[4] = rec[3] * 100 // dt # Load % last period
+                rec[3] = 0
+
+    def load(self, name): # % of loop time used by named task in last period
+        return self.tasks[name][4]
+
+    def top(self, n=None): # [(load %, name), ...] busiest first
+        res = sorted(((rec[4], name) for name, rec in self.tasks.items()), reverse=True)
+        return res if n is None else res[:n]
+
+    def reset(self):
+        for rec in self.tasks.values():
+            for n in range(len(rec)):
+                rec[n] = 0
+        self.elapsed_ms = 0
+        self._busy = 0
+        self._tperiod = ticks_us()
+
+    def report(self):
+        elapsed = max(self.elapsed_ms + ticks_diff(ticks_us(), self._tperiod) // 1000, 1)
+        print('Elapsed {}ms idle {}% in last period'.format(elapsed, self.idle))
+        print('Task              Resumes  Total ms  Mean us  Max us  Load %')
+        for name, rec in sorted(self.tasks.items()):
+            print('{:16s}  {:7d}  {:8d}  {:7d}  {:6d}  {:6d}'.format(
+                  name[:16], rec[1], rec[0] // 1000, rec[0] // max(rec[1], 1), rec[2], rec[0] // (10 * elapsed)))
+
+if _cpython:
+    Profiler._run = types.coroutine(Profiler._run)
 
 
 # To access a lockable resource a coro should issue
@@ -38,6 +206,7 @@ def launch(func, tup_args):
 class Lock():
     def __init__(self):
         self._locked = False
+        self._waiting = []
 
     def locked(self):
         return self._locked
@@ -50,17 +219,16 @@ class Lock():
         await asyncio.sleep(0)
 
     async def acquire(self):
-        while True:
-            if self._locked:
-                await asyncio.sleep(0)
-            else:
-                self._locked = True
-                break
+        if self._locked:
+            await _park(self._waiting, self.release)  # Lock is handed over by release()
+        else:
+            self._locked = True
 
     def release(self):
         if not self._locked:
             raise RuntimeError('Attempt to release a lock which has not been set')
-        self._locked = False
+        if not _wake(self._waiting):  # If woken, ownership passes to the waiter
+            self._locked = False
 
 
 # A coro waiting on an event issues await event
@@ -69,6 +237,7 @@ class Lock():
 # event.clear() should be issued
 class Event():
     def __init__(self):
+        self._waiting = []
         self.clear()
 
     def clear(self):
@@ -76,8 +245,8 @@ class Event():
         self._data = None
 
     def __await__(self):
-        while not self._flag:
-            yield from asyncio.sleep(0)
+        if not self._flag:
+            yield from _park(self._waiting)
 
     __iter__ = __await__
 
@@ -87,6 +256,7 @@ class Event():
     def set(self, data=None):
         self._flag = True
         self._data = data
+        _wake_all(self._waiting)
 
     def value(self):
         return self._data
@@ -100,6 +270,7 @@ class Barrier():
         self._participants = participants
         self._func = func
         self._args = args
+        self._waiting = []
         self._reset(True)
 
     def __await__(self):
@@ -108,13 +279,9 @@ class Barrier():
             if self._func is not None:
                 launch(self._func, self._args)
             self._reset(not self._down)
+            _wake_all(self._waiting)
             return
-
-        direction = self._down
-        while True:  # Wait until last waiting thread changes the direction
-            if direction != self._down:
-                return
-            yield from asyncio.sleep(0)
+        yield from _park(self._waiting)  # Wait until last thread arrives
 
     __iter__ = __await__
 
@@ -136,6 +303,7 @@ class Barrier():
 class Semaphore():
     def __init__(self, value=1):
         self._count = value
+        self._waiting = []
 
     async def __aenter__(self):
         await self.acquire()
@@ -145,12 +313,14 @@ class Semaphore():
         await asyncio.sleep(0)
 
     async def acquire(self):
-        while self._count == 0:
-            await asyncio.sleep(0)
-        self._count -= 1
+        if self._count == 0:
+            await _park(self._waiting, self.release)  # Count is handed over by release()
+        else:
+            self._count -= 1
 
     def release(self):
-        self._count += 1
+        if not _wake(self._waiting):  # If woken, the count passes to the waiter
+            self._count += 1
 
 class BoundedSemaphore(Semaphore):
     def __init__(self, value=1):
@@ -158,7 +328,82 @@ class BoundedSemaphore(Semaphore):
         self._initial_value = value
 
     def release(self):
-        if self._count < self._initial_value:
-            self._count += 1
+        if self._waiting or self._count < self._initial_value:
+            super().release()
         else:
             raise ValueError('Semaphore released more than acquired')
+
+# A bounded FIFO queue for passing data between coros, typically from an
+# acquisition coro to a display coro. Items are held in a ring buffer
+# preallocated in the constructor so put and get do not allocate.
+# If the queue is full put() waits (backpressure) unless drop_oldest is set,
+# in which case the oldest item is discarded so the producer never waits.
+class QueueEmpty(Exception):
+    pass
+
+class QueueFull(Exception):
+    pass
+
+class Queue():
+    def __init__(self, maxsize=16, drop_oldest=False):
+        if maxsize < 1:
+            raise ValueError('Queue size must be > 0')
+        self._buf = [None] * maxsize
+        self._maxsize = maxsize
+        self._head = 0  # Index of oldest item
+        self._count = 0
+        self._drop_oldest = drop_oldest
+        self._getters = []
+        self._putters = []
+        self.dropped = 0  # No. of items discarded by drop_oldest policy
+
+    def qsize(self):
+        return self._count
+
+    def empty(self):
+        return self._count == 0
+
+    def full(self):
+        return self._count == self._maxsize
+
+    def put_nowait(self, item):
+        if self._count == self._maxsize:
+            if not self._drop_oldest:
+                raise QueueFull()
+            self._buf[self._head] = None
+            self._head = (self._head + 1) % self._maxsize
+            self._count -= 1
+            self.dropped += 1
+        self._buf[(self._head + self._count) % self._maxsize] = item
+        self._count += 1
+        if self._getters:
+            _wake(self._getters)
+
+    def get_nowait(self):
+        if self._count == 0:
+            raise QueueEmpty()
+        item = self._buf[self._head]
+        self._buf[self._head] = None  # Don't keep a reference
+        self._head = (self._head + 1) % self._maxsize
+        self._count -= 1
+        if self._putters:
+            _wake(self._putters)
+        return item
+
+    def _pass_put(self):  # A woken putter was cancelled: wake another
+        if self._count < self._maxsize:
+            _wake(self._putters)
+
+    def _pass_get(self):
+        if self._count:
+            _wake(self._getters)
+
+    async def put(self, item):
+        while self._count == self._maxsize and not self._drop_oldest:
+            await _park(self._putters, self._pass_put)
+        self.put_nowait(item)
+
+    async def get(self):
+        while self._count == 0:
+            await _park(self._getters, self._pass_get)
+        return self.get_nowait()
@@ -0,0 +1,69 @@
+# asynbench.py Event loop throughput with idle waiters on asyn primitives
+# Released under the MIT license
+
+# A counting coro yields to the scheduler as fast as it can for a fixed period
+# while n coros wait on an Event, a Lock and a Semaphore. With wait queues the
+# count should be almost independent of n. Runs on the Pyboard or Unix build.
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    from time import time
+    def ticks_ms():
+        return int(time() * 1000)
+    def ticks_diff(a, b):
+        return a - b
+import gc
+import asyn
+
+PERIOD = 1000 # ms
+
+async def waiter(primitive):
+    if isinstance(primitive, asyn.Event):
+        await primitive
+    else:
+        await primitive.acquire()
+        primitive.release()
+
+async def counter():
+    count = 0
+    start = ticks_ms()
+    while ticks_diff(ticks_ms(), start) < PERIOD:
+        await asyncio.sleep(0)
+        count += 1
+    return count
+
+async def run(n):
+    loop = asyncio.get_event_loop()
+    event = asyn.Event()
+    lock = asyn.Lock()
+    sema = asyn.Semaphore(0)
+    await lock.acquire()
+    for primitive in (event, lock, sema):
+        for _ in range(n):
+            loop.create_task(waiter(primitive))
+    await asyncio.sleep(0) # Let waiters start waiting
+    count = await counter()
+    event.set() # Release all waiters
+    lock.release()
+    for _ in range(n):
+        sema.release()
+    await asyncio.sleep(0)
+    return count
+
+async def main():
+    print('Waiters per primitive  Loop passes/s')
+    for n in (1, 10, 100):
+        gc.collect()
+        count = await run(n)
+        print('{:21d}  {:13d}'.format(n, count * 1000 // PERIOD))
+
+def test():
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main())
+
+test()
@@ -0,0 +1,125 @@
+# asyntest.py Tests of asyn.py primitives when a waiting coro is cancelled
+# Released under the MIT license
+
+# A coro blocked in acquire() on a Lock or Semaphore is cancelled, either
+# before the holder releases or after the release has handed the resource to
+# it but before it has run. In neither case may the resource be lost with the
+# cancelled coro, so a subsequent acquire must succeed. Likewise a Queue
+# getter or putter woken and then cancelled must pass the wakeup on to the
+# next one. Runs on the Pyboard, Unix build or CPython.
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+import asyn
+
+TIMEOUT = 10 # Loop passes allowed for a reacquire
+
+async def waiter(primitive):
+    await primitive.acquire()
+    primitive.release()
+
+def cancel(task, coro):
+    if asyn._cpython:
+        task.cancel()
+    else:
+        asyncio.cancel(coro)
+
+async def reacquire(primitive):
+    done = []
+    async def get():
+        await primitive.acquire()
+        done.append(True)
+    loop = asyncio.get_event_loop()
+    loop.create_task(get())
+    for _ in range(TIMEOUT):
+        await asyncio.sleep(0)
+        if done:
+            primitive.release()
+            return True
+    return False
+
+# Orders of events after the waiter has blocked
+CANCEL_SETTLE_RELEASE = 0 # Cancellation takes effect before the release
+CANCEL_RELEASE = 1 # Holder releases before the cancelled coro has run
+RELEASE_CANCEL = 2 # Resource is handed to the waiter, which is then cancelled
+orders = ('Cancel then release', 'Release before cancelled coro runs', 'Release then cancel')
+
+async def cancelled_waiter(name, primitive, order):
+    loop = asyncio.get_event_loop()
+    await primitive.acquire() # Hold the resource
+    coro = waiter(primitive)
+    task = loop.create_task(coro)
+    await asyncio.sleep(0) # Let waiter block in acquire()
+    if order == RELEASE_CANCEL:
+        primitive.release()
+        cancel(task, coro)
+    else:
+        cancel(task, coro)
+        if order == CANCEL_SETTLE_RELEASE:
+            await asyncio.sleep(0) # Let cancellation take effect
+        primitive.release()
+    ok = await reacquire(primitive)
+    print('{:20s} {}'.format(name, 'PASS' if ok else 'FAIL'))
+    return ok
+
+async def settle(done):
+    for _ in range(TIMEOUT):
+        await asyncio.sleep(0)
+        if done:
+            return True
+    return False
+
+# Two coros wait on an empty Queue. An item is put, waking the first, which is
+# then cancelled: the second must get the item.
+async def cancelled_getter():
+    loop = asyncio.get_event_loop()
+    queue = asyn.Queue(2)
+    got = []
+    async def get():
+        got.append(await queue.get())
+    coros = [get(), get()]
+    tasks = [loop.create_task(coro) for coro in coros]
+    await asyncio.sleep(0) # Let both block in get()
+    queue.put_nowait(1)
+    cancel(tasks[0], coros[0])
+    ok = await settle(got) and got == [1] and queue.qsize() == 0
+    print('{:20s} {}'.format('Queue get', 'PASS' if ok else 'FAIL'))
+    return ok
+
+# Likewise two coros wait on a full Queue and an item is removed.
+async def cancelled_putter():
+    loop = asyncio.get_event_loop()
+    queue = asyn.Queue(1)
+    queue.put_nowait(0)
+    put = []
+    async def putter(n):
+        await queue.put(n)
+        put.append(n)
+    coros = [putter(1), putter(2)]
+    tasks = [loop.create_task(coro) for coro in coros]
+    await asyncio.sleep(0) # Let both block in put()
+    queue.get_nowait()
+    cancel(tasks[0], coros[0])
+    ok = await settle(put) and put == [2] and queue.get_nowait() == 2
+    print('{:20s} {}'.format('Queue put', 'PASS' if ok else 'FAIL'))
+    return ok
+
+async def main():
+    results = []
+    for order, title in enumerate(orders):
+        print(title)
+        results.append(await cancelled_waiter('Lock', asyn.Lock(), order))
+        results.append(await cancelled_waiter('Semaphore', asyn.Semaphore(1), order))
+        results.append(await cancelled_waiter('BoundedSemaphore', asyn.BoundedSemaphore(1), order))
+    print('Queue: wake then cancel')
+    results.append(await cancelled_getter())
+    results.append(await cancelled_putter())
+    print('All tests passed' if all(results) else 'Test failure')
+
+def test():
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main())
+
+test()
@@ -0,0 +1,74 @@
+# numtest.py Demo and heap allocation test for the NumericDisplay class
+# Released under the MIT license
+
+# A NumericDisplay and a Label show the same rapidly changing value. The heap
+# allocation per update of each is measured with the garbage collector
+# disabled and reported on screen and at the REPL. The NumericDisplay should
+# allocate nothing when passed integers.
+
+import uasyncio as asyncio
+import gc
+from constants import *
+from ugui import NumericDisplay, Label, Button, Screen
+import font10
+import font14
+from tft_local import setup
+
+NUPDATES = 200
+
+def quitbutton():
+    def quit(button):
+        Screen.shutdown()
+    Button((390, 240), font = font14, callback = quit, fgcolor = RED,
+           text = 'Quit', shape = RECTANGLE, width = 80, height = 30)
+
+class NumericScreen(Screen):
+    def __init__(self):
+        super().__init__()
+        Label((10, 10), font = font14, value = 'NumericDisplay')
+        self.nd = NumericDisplay((200, 10), font = font14, ndigits = 8, decimals = 2,
+                                 border = 2, fgcolor = RED, fontcolor = YELLOW)
+        Label((10, 50), font = font14, value = 'Label')
+        self.lbl = Label((200, 50), font = font14, width = 120, border = 2, fgcolor = RED,
+                         fontcolor = YELLOW)
+        self.lbl_nd = Label((10, 110), font = font10, width = 400)
+        self.lbl_lbl = Label((10, 140), font = font10, width = 400)
+        quitbutton()
+        loop = asyncio.get_event_loop()
+        loop.create_task(self.run())
+
+    def measure(self, update):
+        gc.collect()
+        gc.disable()
+        start = gc.mem_alloc()
+        for n in range(NUPDATES):
+            update(n * 37 - 3000)
+        used = gc.mem_alloc() - start
+        gc.enable()
+        return used / NUPDATES
+
+    async def run(self):
+        await asyncio.sleep_ms(500) # Let screen draw
+        nd = self.nd
+        lbl = self.lbl
+        nd_bytes = self.measure(nd.value)
+        lbl_bytes = self.measure(lambda n : lbl.value('{:.2f}'.format(n / 100)))
+        s_nd = 'NumericDisplay: {:5.1f} bytes per update'.format(nd_bytes)
+        s_lbl = 'Label with format: {:5.1f} bytes per update'.format(lbl_bytes)
+        print(s_nd)
+        print(s_lbl)
+        self.lbl_nd.value(s_nd)
+        self.lbl_lbl.value(s_lbl)
+        n = 0
+        while True:
+            await asyncio.sleep_ms(50)
+            n += 1
+            nd.value(n)
+            lbl.value('{:.2f}'.format(n / 100))
+
+def test():
+    print('Test TFT panel...')
+    setup()
+    Screen.change(NumericScreen)
+
+test()
@@ -25,6 +25,7 @@ from ugui import NoTouch, dolittle, Screen
 from constants import *
 from math import pi
 from cmath import rect
+from array import array
 
 class Curve(object):
     def __init__(self, graph, populate=dolittle, args=[], origin=(0, 0), excursion=(1, 1), color=YELLOW):
@@ -96,6 +97,15 @@ class CartesianGraph(NoTouch, Graph):
         self.y_axis_len = max(yorigin, ydivs - yorigin) * height / ydivs
         self.xp_origin = self.x0 + xorigin * width / xdivs # Origin in pixels
         self.yp_origin = self.y0 + (ydivs - yorigin) * height / ydivs
+        # Static geometry: grid line positions. The axes are drawn in fgcolor.
+        self._ygrid = array('h')
+        if ydivs > 0:
+            dy = (self.y1 - self.y0) / (ydivs) # Y grid line
+            self._ygrid = array('h', [int(self.y1 - dy * line) for line in range(ydivs + 1)])
+        self._xgrid = array('h')
+        if xdivs > 0:
+            dx = (self.x1 - self.x0) / (xdivs) # X grid line
+            self._xgrid = array('h', [int(self.x0 + dx * line) for line in range(xdivs + 1)])
 
     def show(self):
         tft = self.tft
@@ -103,20 +113,12 @@ class CartesianGraph(NoTouch, Graph):
         x1 = self.x1
         y0 = self.y0
         y1 = self.y1
-        if self.ydivs > 0:
-            height = y1 - y0
-            dy = height / (self.ydivs) # Y grid line
-            for line in range(self.ydivs + 1):
-                color = self.fgcolor if line == self.yorigin else self.gridcolor
-                ypos = int(y1 - dy * line)
-                tft.draw_hline(x0, ypos, x1 - x0, color)
-        if self.xdivs > 0:
-            width = x1 - x0
-            dx = width / (self.xdivs) # X grid line
-            for line in range(self.xdivs + 1):
-                color = self.fgcolor if line == self.xorigin else self.gridcolor
-                xpos = int(x0 + dx * line)
-                tft.draw_vline(xpos, y0, y1 - y0, color)
+        for line, ypos in enumerate(self._ygrid):
+            color = self.fgcolor if line == self.yorigin else self.gridcolor
+            tft.draw_hline(x0, ypos, x1 - x0, color)
+        for line, xpos in enumerate(self._xgrid):
+            color = self.fgcolor if line == self.xorigin else self.gridcolor
+            tft.draw_vline(xpos, y0, y1 - y0, color)
         for curve in self.curves:
             curve.show()
 
@@ -25,6 +25,7 @@
 import uasyncio as asyncio
 from plot import PolarGraph, PolarCurve, CartesianGraph, Curve
 from ugui import Button, Label, Screen
+from asyn import Queue, create_task
 from constants import *
 from tft_local import setup
 import font14
@@ -127,6 +128,8 @@ class XYScreen(Screen):
             x += 0.1
 
 # Simulate slow real time data acquisition and plotting
+# Acquisition and plotting run as separate coros linked by a Queue, so the
+# sampling rate is independent of the time taken to draw.
 class RealtimeScreen(Screen):
     def __init__(self):
         super().__init__()
@@ -139,25 +142,34 @@ class RealtimeScreen(Screen):
         self.buttonlist.append(refreshbutton(390, 140, (curve,)))
 
     def populate(self, curve):
-        loop = asyncio.get_event_loop()
-        loop.create_task(self.acquire(curve))
+        queue = Queue(8)
+        create_task(self.acquire(queue), 'acquire')
+        create_task(self.plot(curve, queue), 'plot')
 
-    async def acquire(self, curve):
-        for but in self.buttonlist:
-            but.greyed_out(True)
+    async def acquire(self, queue): # Producer
         x = -1
         await asyncio.sleep(0)
         while x < 1.01:
             y = max(1 - x * x, 0) # possible precison issue
-            curve.point(x, y ** 0.5)
+            await queue.put((x, y ** 0.5))
             x += 0.05
             await asyncio.sleep_ms(250)
         x = 1
         while x > -1.01:
             y = max(1 - x * x, 0)
-            curve.point(x, -(y ** 0.5))
+            await queue.put((x, -(y ** 0.5)))
             x -= 0.05
             await asyncio.sleep_ms(250)
+        await queue.put(None) # End of data
+
+    async def plot(self, curve, queue): # Consumer
+        for but in self.buttonlist:
+            but.greyed_out(True)
+        while True:
+            point = await queue.get()
+            if point is None:
+                break
+            curve.point(*point)
         for but in self.buttonlist:
             but.greyed_out(False)
 
@@ -0,0 +1,69 @@
+# replaytest.py Headless demo of touch_replay.py. Runs on the Pyboard, the
+# Unix build of MicroPython or CPython: no display or touch panel is required.
+# Released under the MIT license
+
+# A scripted panel producing a tap followed by a drag is recorded in raw mode.
+# The recording is replayed at double speed through the touch driver's
+# filtering into a loop which stands in for the GUI's touch thread, and the
+# touch to callback latency histogram is printed.
+# To measure a real application on the Pyboard, record with
+#   TouchRecorder(touch, '/sd/touch.trc', raw = True)
+# in tft_local.setup() and call its close() method when done. To replay, edit
+# setup() to instantiate
+#   touch = ReplayTouch('/sd/touch.trc', calibration = ...)
+# and after Screen.setup() assign
+#   Screen.dispatcher = LatencyProbe(touch, tft)
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from touch_replay import TouchRecorder, ReplayTouch, LatencyProbe, async_sleep_ms
+
+FILENAME = 'touch.trc'
+
+class ScriptedPanel(object): # Stands in for a TOUCH instance
+    def __init__(self):
+        self.n = 0
+        self.touched = False
+
+    def raw_touch(self):
+        n = self.n
+        self.n += 1
+        if 10 <= n < 20: # Tap
+            return (2000, 2000)
+        if 40 <= n < 100: # Drag
+            return (1000 + 30 * (n - 40), 2000)
+        return None
+
+async def record():
+    panel = ScriptedPanel()
+    recorder = TouchRecorder(panel, FILENAME, raw = True)
+    for _ in range(120):
+        panel.raw_touch()
+        await async_sleep_ms(10)
+    recorder.close()
+    print('Recorded {} samples'.format(recorder.count))
+
+def callback(obj, x, y):
+    pass
+
+async def replay():
+    touch = ReplayTouch(FILENAME, speed = 2)
+    probe = LatencyProbe(touch)
+    while not touch.done or touch.touched: # Minimal version of Screen._touchtest
+        if touch.ready:
+            x, y = touch.get_touch_async()
+            probe.call(callback, None, (x, y))
+        await async_sleep_ms(0)
+    probe.callback.show('Touch to callback')
+
+async def main():
+    await record()
+    await replay()
+
+def test():
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main())
+
+test()
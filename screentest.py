@@ -38,6 +38,7 @@ def to_string(val):
 
 def quitbutton(x, y):
     def quit(button):
+        Screen.report() # Build and redraw times of each screen
         Screen.shutdown()
     Button((x, y), height = 30, font = font14, callback = quit, fgcolor = RED,
            text = 'Quit', shape = RECTANGLE, width = 80)
@@ -0,0 +1,119 @@
+# spitest.py Tests of touch_spi.py using a fake SPI bus. Runs on the Pyboard,
+# the Unix build of MicroPython or CPython: no touch controller is required.
+# Released under the MIT license
+
+# FakeXPT2046 answers each conversion command of a transfer with the value
+# of the corresponding channel, as the controller does. The tests check the
+# decoding of a transfer, chip select, rejection of an untouched panel and of
+# light contacts, and the asynchronous thread's acceptance of a touch.
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from touch_spi import TOUCH, transfer, async_sleep_ms, T_GETX, T_GETY, T_GETZ1, T_GETZ2
+
+IDENTITY = (0, 1, 0, 1, 0, 1, 0, 1) # Calibration: screen coords are raw values
+
+class FakeCS(object):
+    def __init__(self):
+        self.state = 1
+
+    def value(self, v=None):
+        if v is not None:
+            self.state = v
+        return self.state
+
+class FakeXPT2046(object): # Stands in for the SPI bus
+    def __init__(self, cs=None):
+        self.cs = cs
+        self.transfers = 0
+        self.selected = True # Chip select was low during every transfer
+        self.release()
+
+    def touch(self, x, y, z1=1000, z2=2000):
+        self.chans = {T_GETX : x, T_GETY : y, T_GETZ1 : z1, T_GETZ2 : z2}
+
+    def release(self): # An untouched panel reads X near 0, Y near 4095, no pressure
+        self.touch(0, 4095, 0, 4095)
+
+    def write_readinto(self, txbuf, rxbuf):
+        self.transfers += 1
+        if self.cs is not None and self.cs.value():
+            self.selected = False
+        for i in range(0, len(txbuf), 3):
+            v = self.chans[txbuf[i]] << 3 # Busy bit, 12 result bits, 3 zeros
+            rxbuf[i] = 0
+            rxbuf[i + 1] = v >> 8
+            rxbuf[i + 2] = v & 0xff
+
+def check(name, ok):
+    print('{:28s} {}'.format(name, 'PASS' if ok else 'FAIL'))
+    return ok
+
+def test_transfer():
+    spi = FakeXPT2046()
+    tp = TOUCH(spi = spi)
+    ok = True
+    for v in ((0, 0, 0, 0), (4095, 4095, 4095, 4095), (1234, 2345, 345, 3456)):
+        spi.touch(*v)
+        ok = ok and transfer(spi, tp.txbuf, tp.rxbuf, [0, 0, 0, 0]) == list(v)
+    return check('Transfer decoding', ok)
+
+def test_cs():
+    cs = FakeCS()
+    spi = FakeXPT2046(cs)
+    tp = TOUCH(spi = spi, cs = cs)
+    tp.read_xyz()
+    return check('Chip select', spi.selected and cs.value() == 1 and spi.transfers == 1)
+
+def test_raw():
+    spi = FakeXPT2046()
+    tp = TOUCH(spi = spi)
+    ok = tp.raw_touch() is None
+    spi.touch(1500, 2500)
+    ok = ok and tp.raw_touch() == (1500, 2500) and tp.z == 1000 + 4095 - 2000
+    return check('Touch and release', ok)
+
+def test_pressure():
+    spi = FakeXPT2046()
+    tp = TOUCH(spi = spi, pressure = 400)
+    spi.touch(1500, 2500, 100, 3900) # Light contact: z = 295
+    ok = tp.raw_touch() is None
+    spi.touch(1500, 2500) # z = 3095
+    ok = ok and tp.raw_touch() == (1500, 2500)
+    return check('Pressure qualification', ok)
+
+def test_sync():
+    spi = FakeXPT2046()
+    tp = TOUCH(spi = spi, calibration = IDENTITY, delay = 5)
+    spi.touch(1500, 2500)
+    return check('Synchronous get_touch', tp.get_touch(initial = False, timeout = 200) == (1500, 2500))
+
+async def test_async():
+    spi = FakeXPT2046()
+    tp = TOUCH(asyn = True, spi = spi, calibration = IDENTITY, pressure = 400, confidence = 1,
+               idle_delay = 5, touch_delay = 5)
+    await async_sleep_ms(20)
+    ok = not tp.touched and tp.get_touch_async() is None
+    spi.touch(1500, 2500)
+    for _ in range(20):
+        await async_sleep_ms(5)
+        if tp.ready:
+            break
+    ok = ok and tp.touched and tp.get_touch_async() == (1500, 2500)
+    spi.release()
+    await async_sleep_ms(20)
+    ok = ok and not tp.touched and not tp.ready
+    return check('Asynchronous touch', ok)
+
+async def main():
+    results = [test_transfer(), test_cs(), test_raw(), test_pressure(), test_sync()]
+    results.append(await test_async())
+    print('All tests passed' if all(results) else 'Test failure')
+
+def test():
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main())
+
+test()
@@ -0,0 +1,142 @@
+# switchtest.py Tests of the pin interrupt mode of aswitch.py using simulated
+# pins. Runs on the Pyboard, the Unix build of MicroPython or CPython: no
+# hardware is required.
+# Released under the MIT license
+
+# SimPin has the value() and irq() methods of a Pin. Setting its value calls
+# the IRQ handler on each edge selected by the trigger, as a real pin would.
+# Contact bounce is simulated by a burst of edges. The tests check that each
+# change of state is acted on once, that a bounce which settles in the
+# original state is corrected, that a burst of edges schedules one wakeup,
+# and that Pushbutton long press and double click timing works.
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+import aswitch
+from aswitch import Switch, Pushbutton, async_sleep_ms
+
+DEBOUNCE = 20 # ms: shortened to speed up the tests
+
+class SimPin(object):
+    IRQ_FALLING = 1
+    IRQ_RISING = 2
+    def __init__(self, value=1): # Pulled up: switch open
+        self._value = value
+        self._handler = None
+        self.trigger = 0
+        self.edges = 0
+
+    def irq(self, handler=None, trigger=0):
+        self._handler = handler
+        self.trigger = trigger
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        if v != self._value:
+            self._value = v
+            self.edges += 1
+            if self._handler is not None and self.trigger & (self.IRQ_RISING if v else self.IRQ_FALLING):
+                self._handler(self)
+
+    def bounce(self, v, n=5): # Burst of n edge pairs ending in state v
+        for _ in range(n):
+            self.value(v)
+            self.value(v ^ 1)
+        self.value(v)
+
+def check(name, ok):
+    print('{:28s} {}'.format(name, 'PASS' if ok else 'FAIL'))
+    return ok
+
+async def test_switch():
+    pin = SimPin()
+    events = []
+    sw = Switch(pin, irq = True)
+    sw.close_func(events.append, ('close',))
+    sw.open_func(events.append, ('open',))
+    await async_sleep_ms(DEBOUNCE * 2)
+    ok = pin.trigger == SimPin.IRQ_FALLING | SimPin.IRQ_RISING and not events
+    pin.bounce(0)
+    await async_sleep_ms(DEBOUNCE * 3)
+    ok = ok and events == ['close'] and sw() == 0
+    pin.bounce(1)
+    await async_sleep_ms(DEBOUNCE * 3)
+    ok = ok and events == ['close', 'open'] and sw() == 1
+    return check('Switch debounce', ok)
+
+async def test_glitch(): # A bounce which settles in the original state
+    pin = SimPin()
+    events = []
+    sw = Switch(pin, irq = True)
+    sw.close_func(events.append, ('close',))
+    sw.open_func(events.append, ('open',))
+    pin.value(0)
+    await async_sleep_ms(0) # Acted on at once
+    ok = events == ['close']
+    pin.value(1)
+    await async_sleep_ms(DEBOUNCE * 3)
+    ok = ok and events == ['close', 'open'] and sw() == 1
+    return check('Switch settled state', ok)
+
+async def test_coalesce(): # One wakeup per burst of edges
+    pin = SimPin()
+    checks = []
+    sw = Switch(pin, irq = True)
+    edges = sw._edges
+    check_state = edges.check
+    edges.check = lambda v: (checks.append(v), check_state(v))
+    scheduled = [] # Hold scheduled callbacks as micropython.schedule would
+    schedule = aswitch.schedule
+    aswitch.schedule = lambda func, arg: scheduled.append((func, arg))
+    pin.bounce(0, 20)
+    aswitch.schedule = schedule
+    ok = edges._pending and pin.edges == 41 and len(scheduled) == 1
+    for func, arg in scheduled:
+        func(arg)
+    await async_sleep_ms(DEBOUNCE * 3)
+    ok = ok and not edges._pending and len(checks) == 2 and sw() == 0
+    await async_sleep_ms(DEBOUNCE * 3) # Idle: no further checks
+    ok = ok and len(checks) == 2
+    return check('Edge burst wakes once', ok)
+
+async def test_pushbutton():
+    pin = SimPin()
+    events = []
+    pb = Pushbutton(pin, irq = True)
+    pb.press_func(events.append, ('press',))
+    pb.release_func(events.append, ('release',))
+    pb.long_func(events.append, ('long',))
+    pb.double_func(events.append, ('double',))
+    pin.bounce(0) # Long press
+    await async_sleep_ms(Pushbutton.long_press_ms + DEBOUNCE * 3)
+    pin.bounce(1)
+    await async_sleep_ms(Pushbutton.double_click_ms + DEBOUNCE * 3)
+    ok = events == ['press', 'long', 'release']
+    del events[:]
+    for _ in range(2): # Double click
+        pin.bounce(0)
+        await async_sleep_ms(DEBOUNCE * 2)
+        pin.bounce(1)
+        await async_sleep_ms(DEBOUNCE * 2)
+    await async_sleep_ms(Pushbutton.long_press_ms)
+    ok = ok and events == ['press', 'release', 'double', 'press', 'release']
+    return check('Pushbutton events', ok)
+
+async def main():
+    Switch.debounce_ms = DEBOUNCE
+    Pushbutton.debounce_ms = DEBOUNCE
+    Pushbutton.long_press_ms = 200
+    Pushbutton.double_click_ms = 150
+    results = []
+    for test in (test_switch, test_glitch, test_coalesce, test_pushbutton):
+        results.append(await test())
+    print('All tests passed' if all(results) else 'Test failure')
+
+def test():
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(main())
+
+test()
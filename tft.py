@@ -583,6 +583,36 @@ class TFT:
             TFT_io.displaySCR_bmp(data, sx*sy, 8, colortable)
 
 #
+# Read the pixels of a rectangle at x,y with size sx, sy into buf, which must
+# hold sx * sy * 3 bytes. The data are in the controller's byte order and are
+# written back unchanged by writeBitmap.
+#
+    def readBitmap(self, x, y, sx, sy, buf):
+        self.setXY(x, y, x + sx - 1, y + sy - 1)
+        TFT_io.tft_read_cmd_data_AS(0x2e, buf, sx * sy * 3)
+
+    def writeBitmap(self, x, y, sx, sy, buf):
+        self.setXY(x, y, x + sx - 1, y + sy - 1)
+        TFT_io.tft_write_data_AS(buf, sx * sy * 3)
+#
+# Draw a glyph in a cell cw pixels wide at x, y without allocating memory.
+# glyph is a tuple (address, rows, dcols, xoffset): the address of the font
+# bitmap, its height and its width rounded up to 8, and its offset in the cell.
+# A zero address draws an empty cell. control is a bytearray laid out as
+# text_color (background color, color, transparency 2), bgvect the background
+# color and bg_buf a buffer of at least rows * dcols * 3 bytes.
+#
+    def drawGlyph(self, x, y, cw, glyph, control, bgvect, bg_buf):
+        addr, rows, dcols, xoff = glyph
+        self.setXY(x, y, x + cw - 1, y + rows - 1)
+        TFT_io.fillSCR_AS(bgvect, cw * rows)
+        if addr:
+            x += xoff
+            self.setXY(x, y, x + dcols - 1, y + rows - 1)
+            TFT_io.tft_read_cmd_data_AS(0x2e, bg_buf, rows * dcols * 3) # Preserve pixels beyond cell
+            self.setXY(x, y, x + dcols - 1, y + rows - 1)
+            TFT_io.displaySCR_charbitmap(addr, rows * dcols, control, bg_buf)
+#
 # set scroll area to the region between the first and last line
 #
     def setScrollArea(self, tfa, vsa, bfa):
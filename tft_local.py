@@ -35,5 +35,7 @@ def setup():
     tft = TFT_G("SSD1963", "LB04301", LANDSCAPE)
     touch = TOUCH("XPT2046", True, confidence = 50, margin = 50)
     # (-3886,-0.1287,-3812,-0.132,-3797,-0.07685,-3798,-0.07681))
+    # Pressure qualified alternative: light contacts are rejected so confidence can be reduced
+    # touch = TOUCH("XPT2046", True, confidence = 5, margin = 50, pressure = 400)
     tft.backlight(100) # light on: remove this line if you don't have backlight control hardware
     Screen.setup(tft, touch)
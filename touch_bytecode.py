@@ -26,6 +26,10 @@
 # It uses Y5..Y8 of PyBoard
 #
 import pyb, stm
+import uasyncio as asyncio
+from asyn import create_task
+from touch_params import TouchParameters
+from time import ticks_us
 # define constants
 #
 PCB_VERSION = 2
@@ -54,7 +58,7 @@ T_GETZ2 = const(0xc8)  ## 8 bit resolution
 X_LOW  = const(10)     ## lowest reasonable X value from the touchpad
 Y_HIGH = const(4090)   ## highest reasonable Y value 
 
-class TOUCH:
+class TOUCH(TouchParameters):
 #
 # Init just sets the PIN's to In / out as required
 # async: set True if asynchronous operation intended
@@ -62,9 +66,15 @@ class TOUCH:
 #       which the function will sample until it accepts it as a valid touch
 # margin: Difference from mean centre at which touches are considered at the same position 
 # delay: Delay between samples in ms. (n/a if asynchronous)
+# pressure: Minimum pressure (Z1/Z2 derived, 12 bit ADC units) for a sample to be accepted.
+#       0 disables pressure qualification. Qualified touches allow confidence values down to 1.
+# idle_delay: Asynchronous mode. Delay between samples in ms while the panel is not touched.
+# touch_delay: Asynchronous mode. Delay between samples in ms while touched or dragged.
+#       Increasing these leaves more CPU time for other tasks at the cost of touch latency.
 #
     DEFAULT_CAL = (-3917, -0.127, -3923, -0.1267, -3799, -0.07572, -3738,  -0.07814)
-    def __init__(self, controller = "XPT2046", asyn = False, *, confidence = 5, margin = 50, delay = 10, calibration = None):
+    def __init__(self, controller = "XPT2046", asyn = False, *, confidence = 5, margin = 50, delay = 10, calibration = None,
+                 pressure = 0, idle_delay = 20, touch_delay = 0):
         if PCB_VERSION == 1:
             self.pin_clock = pyb.Pin("Y8", pyb.Pin.OUT_PP)
             self.pin_clock.value(0)
@@ -80,36 +90,18 @@ class TOUCH:
 # set default values
         self.ready = False
         self.touched = False
+        self.t_ready = 0 # ticks_us() when the latest touch was accepted
         self.x = 0
         self.y = 0
+        self.z = 0 # Pressure of latest sample
+        self.pressure = max(pressure, 0)
         self.buf_length = 0
         cal = TOUCH.DEFAULT_CAL if calibration is None else calibration
         self.asynchronous = False
-        self.touch_parameter(confidence, margin, delay, cal)
+        self.touch_parameter(confidence, margin, delay, cal, None, idle_delay, touch_delay)
         if asyn:
             self.asynchronous = True
-            import uasyncio as asyncio
-            loop = asyncio.get_event_loop()
-            loop.create_task(self._main_thread())
-
-# set parameters for get_touch()
-# res: Resolution in bits of the returned values, default = 10
-# confidence: confidence level - number of consecutive touches with a margin smaller than the given level
-#       which the function will sample until it accepts it as a valid touch
-# margin: Difference from mean centre at which touches are considered at the same position 
-# delay: Delay between samples in ms.
-#
-    def touch_parameter(self, confidence = 5, margin = 50, delay = 10, calibration = None):
-        if not self.asynchronous: # Ignore attempts to change on the fly.
-            confidence = max(min(confidence, 25), 5)
-            if confidence != self.buf_length:
-                self.buff = [[0,0] for x in range(confidence)]
-                self.buf_length = confidence
-            self.delay = max(min(delay, 100), 5)
-            margin = max(min(margin, 100), 1)
-            self.margin = margin * margin # store the square value
-            if calibration:
-                self.calibration = calibration
+            create_task(self._main_thread(), 'touch')
 
 # get_touch(): Synchronous use. get a touch value; Parameters:
 #
@@ -169,20 +161,24 @@ class TOUCH:
         return None
 
 # Asynchronous use: this thread maintains self.x and self.y
+# Sampling is at a low rate until the panel is touched, then at a high rate
+# until it is released.
     async def _main_thread(self):
-        import uasyncio as asyncio  # Why is this necessary in touch_bytecode but not in touch??
-        buff = self.buff
-        buf_length = self.buf_length
-        buffptr = 0
-        nsamples = 0
+        buff = None
         await asyncio.sleep(0)
         while True:
+            if buff is not self.buff: # Initialising or confidence has changed
+                buff = self.buff
+                buf_length = self.buf_length
+                buffptr = 0
+                nsamples = 0
             if nsamples == buf_length:
                 meanx = sum([c[0] for c in buff]) // buf_length
                 meany = sum([c[1] for c in buff]) // buf_length
                 dev = sum([(c[0] - meanx)**2 + (c[1] - meany)**2 for c in buff]) / buf_length
                 if dev <= self.margin: # got one; compare against the square value
                     self.ready = True
+                    self.t_ready = ticks_us()
                     self.x, self.y = self.do_normalize((meanx, meany))
             sample = self.raw_touch()  # get a touch
             if sample == None:
@@ -194,7 +190,7 @@ class TOUCH:
                 buff[buffptr] = sample # put in buff
                 buffptr = (buffptr + 1) % buf_length
                 nsamples = min(nsamples + 1, buf_length)
-            await asyncio.sleep(0)
+            await asyncio.sleep_ms(self.touch_delay if self.touched else self.idle_delay)
 
 # Asynchronous get_touch
     def get_touch_async(self):
@@ -218,8 +214,16 @@ class TOUCH:
 #
 # raw_touch(tuple)
 # raw read touch. Returns (x,y) or None
+# With pressure qualification Z1 and Z2 are read first: a light or ghost
+# contact is rejected without reading X and Y. self.z holds the pressure.
 #
     def raw_touch(self):
+        if self.pressure:
+            z1 = self.touch_talk(T_GETZ1, 8)
+            z2 = self.touch_talk(T_GETZ2, 8)
+            self.z = (z1 + 255 - z2) << 4 # Scale to 12 bits
+            if self.z < self.pressure:
+                return None
         x  = self.touch_talk(T_GETX, 12)
         y  = self.touch_talk(T_GETY, 12)
         if x > X_LOW and y < Y_HIGH:  # touch pressed?
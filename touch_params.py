@@ -0,0 +1,36 @@
+# touch_params.py Parameter handling shared by the touch panel drivers
+# touch.py, touch_bytecode.py and touch_spi.py
+# Released under the MIT license
+
+# set touch parameters. These may be changed on the fly in asynchronous mode.
+# An argument of None leaves the parameter unchanged.
+# confidence: confidence level - number of consecutive touches with a margin smaller than the given level
+#       which the function will sample until it accepts it as a valid touch
+# margin: Difference from mean centre at which touches are considered at the same position
+# delay: Delay between samples in ms (synchronous mode).
+# calibration: Calibration vector
+# pressure: Minimum pressure, 0 = no pressure qualification
+# idle_delay, touch_delay: Delays between samples in asynchronous mode
+#
+class TouchParameters:
+    def touch_parameter(self, confidence = None, margin = None, delay = None, calibration = None, pressure = None,
+                        idle_delay = None, touch_delay = None):
+        if pressure is not None:
+            self.pressure = max(pressure, 0)
+        if confidence is None:
+            confidence = self.buf_length # Lower limit depends on pressure
+        confidence = max(min(confidence, 25), 1 if self.pressure else 5)
+        if confidence != self.buf_length: # A new buffer is adopted by the asynchronous thread
+            self.buff = [[0,0] for x in range(confidence)]
+            self.buf_length = confidence
+        if delay is not None:
+            self.delay = max(min(delay, 100), 5)
+        if margin is not None:
+            margin = max(min(margin, 100), 1)
+            self.margin = margin * margin # store the square value
+        if calibration:
+            self.calibration = calibration
+        if idle_delay is not None:
+            self.idle_delay = max(min(idle_delay, 100), 0)
+        if touch_delay is not None:
+            self.touch_delay = max(min(touch_delay, 100), 0)
@@ -0,0 +1,236 @@
+# touch_replay.py Record and replay touch panel input for latency measurement
+# Released under the MIT license
+
+# TouchRecorder logs the samples read from a TOUCH instance (touch.py,
+# touch_bytecode.py or touch_spi.py) to a binary file. ReplayTouch is a TOUCH
+# stand-in which feeds a recording back to the GUI at the original or an
+# accelerated speed. LatencyProbe measures the time from each replayed sample
+# to the resulting callback and to the first subsequent display access, and
+# accumulates Histogram instances. Only replay, the file format and histograms
+# are needed on Linux: none of these use the Pyboard hardware.
+
+# File format: a 4 byte header b'TRC' followed by b'R' (raw samples as returned
+# by raw_touch) or b'N' (normalised screen coordinates as returned by
+# get_touch_async). Then 8 byte records of '<Ihh': time in ms since the start of
+# recording, x and y. A release is recorded as x == y == -1.
+
+import struct
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    from time import ticks_ms, ticks_diff
+except ImportError:
+    from time import time
+    def ticks_ms():
+        return int(time() * 1000)
+    def ticks_diff(a, b):
+        return a - b
+from touch_spi import TOUCH, ticks_us, async_sleep_ms
+from asyn import create_task
+
+_HEADER = b'TRC'
+_FMT = '<Ihh'
+_RECLEN = 8
+_RELEASE = -1
+
+# Records are buffered and written in blocks. In raw mode every sample read
+# while touched is logged but repeated releases are not.
+class TouchRecorder(object):
+    def __init__(self, touch, filename, *, raw=False, nrecords=64):
+        self.touch = touch
+        self.count = 0 # Records written
+        self._file = open(filename, 'wb')
+        self._file.write(_HEADER + (b'R' if raw else b'N'))
+        self._buf = bytearray(_RECLEN * nrecords)
+        self._idx = 0
+        self._released = True
+        self._t0 = ticks_ms()
+        if raw:
+            self._raw_touch = touch.raw_touch
+            touch.raw_touch = self._record_raw # Instance attribute overrides the method
+        else:
+            self._get_touch_async = touch.get_touch_async
+            touch.get_touch_async = self._record_touch
+            create_task(self._release(), 'TouchRecorder')
+
+    def _record(self, x, y):
+        struct.pack_into(_FMT, self._buf, self._idx, ticks_diff(ticks_ms(), self._t0), x, y)
+        self._idx += _RECLEN
+        self.count += 1
+        if self._idx == len(self._buf):
+            self.flush()
+
+    def _record_raw(self):
+        sample = self._raw_touch()
+        if sample is None:
+            if not self._released:
+                self._released = True
+                self._record(_RELEASE, _RELEASE)
+        else:
+            self._released = False
+            self._record(sample[0], sample[1])
+        return sample
+
+    def _record_touch(self):
+        sample = self._get_touch_async()
+        if sample is not None:
+            self._released = False
+            self._record(sample[0], sample[1])
+        return sample
+
+    async def _release(self): # Normalised mode: log the end of each touch
+        while self._file is not None:
+            if not self._released and not self.touch.touched:
+                self._released = True
+                self._record(_RELEASE, _RELEASE)
+            await async_sleep_ms(0)
+
+    def flush(self):
+        if self._idx:
+            self._file.write(memoryview(self._buf)[:self._idx])
+            self._idx = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        self._file = None
+
+
+# A TOUCH instance which replays a recording. A raw recording is passed through
+# the driver's filtering in the usual way: raw_touch returns the recorded sample
+# current at the replay time. A normalised recording sets the touch state
+# directly. speed > 1 replays faster than real time. nevents counts samples
+# which have taken effect: t_event is the ticks_ms() value of the latest. done
+# is True when the recording is exhausted.
+class ReplayTouch(TOUCH):
+    def __init__(self, filename, *, speed=1, **kwargs):
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if data[:3] != _HEADER:
+            raise ValueError('Not a touch recording')
+        self.raw = data[3:4] == b'R'
+        self._data = memoryview(data)[4:]
+        self.nrecords = len(self._data) // _RECLEN
+        self.speed = speed
+        self.nevents = 0
+        self.t_event = None
+        self.done = False
+        self._idx = 0
+        self._sample = None
+        self._t0 = None
+        # raw_touch is overridden: the SPI interface is unused.
+        super().__init__('XPT2046', True, spi = self, **kwargs)
+
+    def _elapsed(self): # Recording time corresponding to now
+        if self._t0 is None:
+            self._t0 = ticks_ms()
+        return ticks_diff(ticks_ms(), self._t0) * self.speed
+
+    def _next(self): # Apply the next record
+        _, x, y = struct.unpack_from(_FMT, self._data, self._idx * _RECLEN)
+        self._idx += 1
+        self.done = self._idx >= self.nrecords
+        self.nevents += 1
+        self.t_event = ticks_ms()
+        return None if x == _RELEASE else (x, y)
+
+    def _due(self): # Recording time of the next record
+        return struct.unpack_from(_FMT, self._data, self._idx * _RECLEN)[0]
+
+    def raw_touch(self):
+        elapsed = self._elapsed()
+        while self._idx < self.nrecords and self._due() <= elapsed:
+            self._sample = self._next()
+        return self._sample
+
+    async def _main_thread(self):
+        if self.raw: # Filter the recorded samples in the usual way
+            await TOUCH._main_thread(self)
+            return
+        await asyncio.sleep(0)
+        while self._idx < self.nrecords:
+            delay = int((self._due() - self._elapsed()) / self.speed)
+            if delay > 0:
+                await async_sleep_ms(delay)
+            sample = self._next()
+            if sample is None:
+                self.touched = False
+                self.ready = False
+            else:
+                self.touched = True
+                self.x, self.y = sample
+                self.ready = True
+                self.t_ready = ticks_us()
+        self.touched = False
+        self.ready = False
+
+
+class Histogram(object):
+    def __init__(self, width_ms=5, nbins=20):
+        self.width_ms = width_ms
+        self.bins = [0] * (nbins + 1) # Last bin counts overflows
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, ms):
+        self.bins[min(ms // self.width_ms, len(self.bins) - 1)] += 1
+        self.count += 1
+        self.total += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    def show(self, title, barlen=40):
+        print(title)
+        if not self.count:
+            print('No samples')
+            return
+        print('Samples {} min {}ms mean {:.1f}ms max {}ms'.format(
+              self.count, self.min, self.total / self.count, self.max))
+        peak = max(self.bins)
+        last = len(self.bins) - 1
+        for n, count in enumerate(self.bins):
+            if count:
+                lo = n * self.width_ms
+                rng = '>= {:4d}'.format(lo) if n == last else '{:4d}-{:4d}'.format(lo, lo + self.width_ms - 1)
+                print('{:>9s}ms {:6d} {}'.format(rng, count, '*' * max(count * barlen // peak, 1)))
+
+
+# Latency is measured from the most recent replayed sample. Each sample
+# contributes at most one measurement of each kind. Assign the probe to
+# Screen.dispatcher: callbacks then run at once as if there were no
+# dispatcher. If a tft (a TFT_G) is passed, a probe is added to its setXY: every
+# drawing operation starts with setXY so its first call marks the first pixel
+# written.
+class LatencyProbe(object):
+    def __init__(self, touch, tft=None, *, width_ms=5, nbins=20):
+        self.touch = touch
+        self.callback = Histogram(width_ms, nbins)
+        self.pixel = Histogram(width_ms, nbins)
+        self._cb_event = 0 # nevents of the last measured sample
+        self._px_event = 0
+        if tft is not None:
+            tft.add_probe(self._probe_setXY)
+
+    def _latency(self):
+        return ticks_diff(ticks_ms(), self.touch.t_event)
+
+    def call(self, func, obj, args, coalesce=False):
+        touch = self.touch
+        if touch.nevents != self._cb_event and touch.t_event is not None:
+            self._cb_event = touch.nevents
+            self.callback.add(self._latency())
+        func(obj, *args)
+
+    def _probe_setXY(self, x1, y1, x2, y2):
+        touch = self.touch
+        if touch.nevents != self._px_event and touch.t_event is not None:
+            self._px_event = touch.nevents
+            self.pixel.add(self._latency())
+
+    def report(self):
+        self.callback.show('Touch to callback')
+        self.pixel.show('Touch to pixel')
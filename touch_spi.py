@@ -0,0 +1,272 @@
+# asyncio version using a hardware SPI interface
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Class supporting the resisitve touchpad of TFT LC-displays
+# First example: Controller XPT2046
+# Unlike touch.py and touch_bytecode.py this driver uses a hardware SPI
+# peripheral. By default this is SPI(2) of the PyBoard, which occupies the
+# otherwise free pins Y6 (T_CLK), Y7 (T_DO) and Y8 (T_DIN). T_CS is either tied
+# to GND or connected to a pin passed to the constructor.
+# X, Y, Z1 and Z2 are read in a single buffered transfer of 12 bytes: at 1MHz
+# this takes about 100µs. write_readinto blocks for the whole transfer, so the
+# CPU is not free during it, but one transfer replaces the four conversions
+# which touch.py clocks out in software.
+#
+# Any object with a write_readinto(txbuf, rxbuf) method may be passed as spi.
+# This allows the transfer logic to be tested on Linux with a fake SPI object:
+# see spitest.py.
+#
+try:
+    import pyb
+except ImportError:
+    pyb = None
+try:
+    from micropython import const
+except ImportError:
+    const = lambda x : x
+try:
+    from time import sleep_ms, ticks_us
+except ImportError:
+    from time import sleep, time
+    def sleep_ms(ms):
+        sleep(ms / 1000)
+    def ticks_us():
+        return int(time() * 1000000)
+try:
+    import uasyncio as asyncio
+    async_sleep_ms = asyncio.sleep_ms
+except ImportError: # CPython
+    import asyncio
+    def async_sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+from asyn import create_task
+from touch_params import TouchParameters
+# define constants
+#
+SPI_BUS = 2
+BAUDRATE = 1000000  # XPT2046 DCLK must not exceed 2.5MHz
+
+T_GETX  = const(0xd0)  ## 12 bit resolution
+T_GETY  = const(0x90)  ## 12 bit resolution
+T_GETZ1 = const(0xb0)  ## 12 bit resolution
+T_GETZ2 = const(0xc0)  ## 12 bit resolution
+#
+X_LOW  = const(10)     ## lowest reasonable X value from the touchpad
+Y_HIGH = const(4090)   ## highest reasonable Y value
+
+# Command byte, then 16 clocks to shift out the busy bit and 12 result bits.
+# Each group of three bytes yields one conversion.
+_CMDS = bytes((T_GETX, 0, 0, T_GETY, 0, 0, T_GETZ1, 0, 0, T_GETZ2, 0, 0))
+
+# Perform the single transfer and decode X, Y, Z1 and Z2 into result (a list
+# of length 4). No allocation: txbuf and rxbuf are preallocated by the caller.
+def transfer(spi, txbuf, rxbuf, result):
+    spi.write_readinto(txbuf, rxbuf)
+    for n in range(4):
+        i = n * 3
+        result[n] = (((rxbuf[i + 1] << 8) | rxbuf[i + 2]) >> 3) & 0xfff
+    return result
+
+class TOUCH(TouchParameters):
+#
+# Init just sets the PIN's to In / out as required
+# async: set True if asynchronous operation intended
+# confidence: confidence level - number of consecutive touches with a margin smaller than the given level
+#       which the function will sample until it accepts it as a valid touch
+# margin: Difference from mean centre at which touches are considered at the same position
+# delay: Delay between samples in ms. (n/a if asynchronous)
+# pressure: Minimum pressure (Z1/Z2 derived, 12 bit ADC units) for a sample to be accepted.
+#       0 disables pressure qualification. Qualified touches allow confidence values down to 1.
+# idle_delay: Asynchronous mode. Delay between samples in ms while the panel is not touched.
+# touch_delay: Asynchronous mode. Delay between samples in ms while touched or dragged.
+#       Increasing these leaves more CPU time for other tasks at the cost of touch latency.
+# spi: SPI instance. If None an instance of SPI(SPI_BUS) is created.
+# cs: optional chip select Pin instance (active low)
+#
+    DEFAULT_CAL = (-3917, -0.127, -3923, -0.1267, -3799, -0.07572, -3738,  -0.07814)
+    def __init__(self, controller = "XPT2046", asyn = False, *, confidence = 5, margin = 50, delay = 10,
+                 calibration = None, pressure = 0, idle_delay = 20, touch_delay = 0, spi = None, cs = None):
+        if spi is None:
+            spi = pyb.SPI(SPI_BUS, pyb.SPI.MASTER, baudrate = BAUDRATE, polarity = 0, phase = 0)
+        self.spi = spi
+        self.cs = cs
+        if cs is not None:
+            cs.value(1)
+        self.txbuf = bytearray(_CMDS)
+        self.rxbuf = bytearray(len(_CMDS))
+        self.xyz = [0, 0, 0, 0] # Last raw X, Y, Z1, Z2
+# set default values
+        self.ready = False
+        self.touched = False
+        self.t_ready = 0 # ticks_us() when the latest touch was accepted
+        self.x = 0
+        self.y = 0
+        self.z = 0 # Pressure of latest sample
+        self.pressure = max(pressure, 0)
+        self.buf_length = 0
+        cal = TOUCH.DEFAULT_CAL if calibration is None else calibration
+        self.asynchronous = False
+        self.touch_parameter(confidence, margin, delay, cal, None, idle_delay, touch_delay)
+        if asyn:
+            self.asynchronous = True
+            create_task(self._main_thread(), 'touch')
+
+# get_touch(): Synchronous use. get a touch value; Parameters:
+#
+# initital: Wait for a non-touch state before getting a sample.
+#           True = Initial wait for a non-touch state
+#           False = Do not wait for a release
+# wait: Wait for a touch or not?
+#       False: Do not wait for a touch and return immediately
+#       True: Wait until a touch is pressed.
+# raw: Setting whether raw touch coordinates (True) or normalized ones (False) are returned
+#      setting the calibration vector to (0, 1, 0, 1, 0, 1, 0, 1) result in a identity mapping
+# timeout: Longest time (ms, or None = 1 hr) to wait for a touch or release
+#
+# Return (x,y) or None
+#
+    def get_touch(self, initial = True, wait = True, raw = False, timeout = None):
+        if self.asynchronous:
+            return None # Should only be called in synhronous mode
+        if timeout == None:
+            timeout = 3600000 # set timeout to 1 hour
+#
+        if initial:  ## wait for a non-touch state
+            sample = True
+            while sample and timeout > 0:
+                sample = self.raw_touch()
+                sleep_ms(self.delay)
+                timeout -= self.delay
+            if timeout <= 0: # after timeout, return None
+                return None
+#
+        buff = self.buff
+        buf_length = self.buf_length
+        buffptr = 0
+        nsamples = 0
+        while timeout > 0:
+            if nsamples == buf_length:
+                meanx = sum([c[0] for c in buff]) // buf_length
+                meany = sum([c[1] for c in buff]) // buf_length
+                dev = sum([(c[0] - meanx)**2 + (c[1] - meany)**2 for c in buff]) / buf_length
+                if dev <= self.margin: # got one; compare against the square value
+                    if raw:
+                        return (meanx, meany)
+                    else:
+                        return self.do_normalize((meanx, meany))
+# get a new value
+            sample = self.raw_touch()  # get a touch
+            if sample == None:
+                if not wait:
+                    return None
+                nsamples = 0    # Invalidate buff
+            else:
+                buff[buffptr] = sample # put in buff
+                buffptr = (buffptr + 1) % buf_length
+                nsamples = min(nsamples +1, buf_length)
+            sleep_ms(self.delay)
+            timeout -= self.delay
+        return None
+
+# Asynchronous use: this thread maintains self.x and self.y
+# Sampling is at a low rate until the panel is touched, then at a high rate
+# until it is released.
+    async def _main_thread(self):
+        buff = None
+        await asyncio.sleep(0)
+        while True:
+            if buff is not self.buff: # Initialising or confidence has changed
+                buff = self.buff
+                buf_length = self.buf_length
+                buffptr = 0
+                nsamples = 0
+            if nsamples == buf_length:
+                meanx = sum([c[0] for c in buff]) // buf_length
+                meany = sum([c[1] for c in buff]) // buf_length
+                dev = sum([(c[0] - meanx)**2 + (c[1] - meany)**2 for c in buff]) / buf_length
+                if dev <= self.margin: # got one; compare against the square value
+                    self.ready = True
+                    self.t_ready = ticks_us()
+                    self.x, self.y = self.do_normalize((meanx, meany))
+            sample = self.raw_touch()  # get a touch
+            if sample == None:
+                self.touched = False
+                self.ready = False
+                nsamples = 0    # Invalidate buff
+            else:
+                self.touched = True
+                buff[buffptr] = sample # put in buff
+                buffptr = (buffptr + 1) % buf_length
+                nsamples = min(nsamples + 1, buf_length)
+            await async_sleep_ms(self.touch_delay if self.touched else self.idle_delay)
+
+# Asynchronous get_touch
+    def get_touch_async(self):
+        if self.ready:
+            self.ready = False
+            return self.x, self.y
+        return None
+#
+# do_normalize(touch)
+# calculate the screen coordinates from the touch values, using the calibration values
+# touch must be the tuple return by get_touch
+#
+    def do_normalize(self, touch):
+        xmul = self.calibration[3] + (self.calibration[1] - self.calibration[3]) * (touch[1] / 4096)
+        xadd = self.calibration[2] + (self.calibration[0] - self.calibration[2]) * (touch[1] / 4096)
+        ymul = self.calibration[7] + (self.calibration[5] - self.calibration[7]) * (touch[0] / 4096)
+        yadd = self.calibration[6] + (self.calibration[4] - self.calibration[6]) * (touch[0] / 4096)
+        x = int((touch[0] + xadd) * xmul)
+        y = int((touch[1] + yadd) * ymul)
+        return (x, y)
+#
+# raw_touch(tuple)
+# raw read touch. Returns (x,y) or None
+# The Z1 and Z2 values of the last transfer are available in self.xyz[2:]
+# and the derived pressure in self.z. With pressure qualification a light or
+# ghost contact is rejected.
+#
+    def raw_touch(self):
+        x, y, z1, z2 = self.read_xyz()
+        self.z = z1 + 4095 - z2
+        if self.z < self.pressure:
+            return None
+        if x > X_LOW and y < Y_HIGH:  # touch pressed?
+            return (x, y)
+        else:
+            return None
+#
+# read_xyz()
+# Read X, Y, Z1 and Z2 in one SPI transfer. Returns a list which is
+# overwritten by the next call.
+#
+    def read_xyz(self):
+        cs = self.cs
+        if cs is not None:
+            cs.value(0)
+        try:
+            transfer(self.spi, self.txbuf, self.rxbuf, self.xyz)
+        finally:
+            if cs is not None:
+                cs.value(1)
+        return self.xyz
@@ -0,0 +1,43 @@
+# touchbench.py Compare sample throughput and jitter of the touch drivers
+# Released under the MIT license
+
+# Each available driver (touch.py, touch_bytecode.py and touch_spi.py) is
+# instantiated in synchronous mode and raw_touch() is timed nsamples times.
+# Results are the same whether or not the panel is touched. Note that a
+# touch_spi.py sample includes Z1 and Z2 as well as X and Y. touch_spi.py needs
+# the panel wired to SPI(2): drivers which fail to initialise are skipped.
+
+import pyb, gc
+
+DRIVERS = ('touch', 'touch_bytecode', 'touch_spi')
+
+def measure(touch, nsamples):
+    times = [0] * nsamples
+    raw_touch = touch.raw_touch
+    gc.collect()
+    start = pyb.micros()
+    for n in range(nsamples):
+        t = pyb.micros()
+        raw_touch()
+        times[n] = pyb.elapsed_micros(t)
+    total = pyb.elapsed_micros(start)
+    mean = sum(times) / nsamples
+    sd = (sum([(t - mean) ** 2 for t in times]) / nsamples) ** 0.5
+    return nsamples * 1000000 / total, mean, min(times), max(times), sd
+
+def test(nsamples=500):
+    print('Driver            Samples/s  Mean us  Min us  Max us  Jitter us  SD us')
+    for name in DRIVERS:
+        try:
+            module = __import__(name)
+            touch = module.TOUCH('XPT2046', False)
+        except Exception as e:
+            print('{:16s}  skipped: {}'.format(name, e))
+            continue
+        rate, mean, tmin, tmax, sd = measure(touch, nsamples)
+        print('{:16s}  {:9.0f}  {:7.1f}  {:6d}  {:6d}  {:9d}  {:5.1f}'.format(
+              name, rate, mean, tmin, tmax, tmax - tmin, sd))
+        del touch, module
+        gc.collect()
+
+test()
@@ -24,9 +24,12 @@
 import uasyncio as asyncio
 import math
 import gc
+from time import ticks_ms, ticks_us, ticks_diff
+from uctypes import addressof
+from array import array
 import TFT_io
 from aswitch import Delay_ms
-from asyn import Event
+from asyn import Event, create_task
 from tft import TFT
 from constants import *
 TWOPI = 2 * math.pi
@@ -61,6 +64,19 @@ def print_centered(tft, x, y, s, color, font, clip=False, scroll=False):
     tft.printString(s)
     tft.setTextStyle(*old_style)
 
+# Bytes held in buffers and strings bound to an object
+def data_bytes(obj):
+    n = 0
+    for v in obj.__dict__.values():
+        if isinstance(v, (bytearray, str)):
+            n += len(v)
+        elif isinstance(v, array):
+            try:
+                n += len(v) * v.itemsize
+            except AttributeError: # MicroPython array
+                n += len(v) * memoryview(v).itemsize
+    return n
+
 def print_left(tft, x, y, s, color, font, clip=False, scroll=False):
     old_style = tft.getTextStyle()
     tft.setTextStyle(color, None, 2, font)
@@ -81,31 +97,71 @@ def desaturate(color, factor): # Desaturate and dim
 # Subclass TFT to enable greying out of controls
 # Some TFT methods call drawHLine and drawVLine: the bound variable 'raw` forces them
 # to use the color of the calling method
+# Greyed colors are held in a palette dict indexed by the normal color. Objects
+# add their colors when instantiated, so drawing greyed-out objects requires only
+# a lookup. Other colors are computed on use: up to grey_cache of these are also
+# held so that the palette cannot grow without limit. The palette is rebuilt
+# when the grey style changes.
+# Instrumentation observes display writes through probes: functions taking the
+# window passed to setXY, which starts every drawing operation. setXY is wrapped
+# once, when the first probe is added, and the wrapper calls every probe before
+# the write, so probes do not affect each other's results.
 class TFT_G(TFT):
+    grey_cache = 16 # Max no. of greyed colors cached on first use
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._is_grey = False
         self._desaturate = True
         self._factor = 2 # Default grey-out methd: dim colors
+        self._greys = {} # Normal color: greyed color
+        self._nextra = 0 # No. of palette entries added on first use
+        self._probes = [] # Called with the window of each setXY
 
     def _getcolor(self, color):
-        if self._is_grey:
-            if self._desaturate:
-                color = desaturate(color, self._factor)
-            else:
-                color = dim(color, self._factor)
+        if self._is_grey and color is not None:
+            try:
+                grey = self._greys.get(color)
+            except TypeError: # Unhashable e.g. a list
+                color = tuple(color)
+                grey = self._greys.get(color)
+            if grey is None:
+                grey = self._grey(color)
+                if self._nextra < self.grey_cache:
+                    self._nextra += 1
+                    self._greys[color] = grey
+            return grey
         return color
 
+    def _grey(self, color):
+        if self._desaturate:
+            return desaturate(color, self._factor)
+        return dim(color, self._factor)
+
+    def _addgrey(self, color):
+        self._greys[color] = self._grey(color)
+
+    def greypalette(self, *colors): # Precompute greyed versions of colors
+        for color in colors:
+            if color is not None and color not in self._greys:
+                self._addgrey(color)
+
+    def _newpalette(self):
+        for color in self._greys:
+            self._addgrey(color)
+
     def desaturate(self, value=None):
-        if value is not None:
+        if value is not None and value != self._desaturate:
             self._desaturate = value
+            self._newpalette()
         return self._desaturate
 
     def dim(self, factor=None):
         if factor is not None:
             if factor <= 1:
                 raise ValueError('Dim factor must be > 1')
-            self._factor = factor
+            if factor != self._factor:
+                self._factor = factor
+                self._newpalette()
         return self._factor
 
     def skeleton(self): # Determine type of greying
@@ -114,6 +170,17 @@ class TFT_G(TFT):
     def usegrey(self, val): # tft.usegrey(True) sets greyed-out
         self._is_grey = val
 
+    def add_probe(self, func): # func(x1, y1, x2, y2) is called before each setXY
+        if not self._probes:
+            self._setXY = self.setXY
+            self.setXY = self._probe
+        self._probes.append(func)
+
+    def _probe(self, x1, y1, x2, y2):
+        for func in self._probes:
+            func(x1, y1, x2, y2)
+        self._setXY(x1, y1, x2, y2)
+
     def draw_rectangle(self, x1, y1, x2, y2, color):
         self.drawRectangle(x1, y1, x2, y2, self._getcolor(color))
 
@@ -164,11 +231,360 @@ class TFT_G(TFT):
 
 # *********** BASE CLASSES ***********
 
+# Garbage collection policy. A collection is made when the RAM allocated since
+# the last one reaches a fraction of the free RAM, but only while the GUI is
+# idle: the panel is not touched and no control is busy, so a drag is never
+# interrupted. The interval between checks adapts to the measured allocation
+# rate so a GUI which allocates little is rarely woken. gc.threshold is set as a
+# backstop: if allocation outruns the policy MicroPython collects automatically.
+# Telemetry: collection count and durations, and free RAM after each collection.
+class GCPolicy(object):
+    def __init__(self, *, fraction=4, min_ms=20, max_ms=2000, nhistory=16):
+        self.fraction = fraction # Collect when allocation reaches mem_free // fraction
+        self.min_ms = min_ms # Limits of interval between checks
+        self.max_ms = max_ms
+        self.count = 0 # Collections made
+        self.deferred = 0 # Checks where a collection was due but the GUI was busy
+        self.total_us = 0 # Duration of all collections
+        self.max_us = 0 # Longest collection
+        self.last_us = 0 # Latest collection
+        self.rate = 0 # Allocation rate in bytes/s
+        self._free = array('i', (0 for _ in range(nhistory))) # Ring buffers
+        self._us = array('i', (0 for _ in range(nhistory)))
+        self._idx = 0
+        self._budget = 0
+        self._alloc = 0 # mem_alloc() after last collection
+        self._tcollect = ticks_ms()
+
+    def idle(self):
+        touch_panel = Screen.objtouch
+        if touch_panel is not None and touch_panel.touched:
+            return False
+        if Screen.current_screen is not None:
+            for obj in Screen.current_screen.touchlist:
+                if obj.busy:
+                    return False
+        return True
+
+    def collect(self):
+        t = ticks_us()
+        gc.collect()
+        dt = ticks_diff(ticks_us(), t)
+        self._tcollect = ticks_ms()
+        free = gc.mem_free()
+        self.count += 1
+        self.total_us += dt
+        self.max_us = max(self.max_us, dt)
+        self.last_us = dt
+        self._idx = (self._idx + 1) % len(self._free)
+        self._free[self._idx] = free
+        self._us[self._idx] = dt
+        self._budget = free // self.fraction
+        self._alloc = gc.mem_alloc()
+        gc.threshold(2 * self._budget + self._alloc) # Backstop
+
+    def history(self): # [(mem_free, duration us), ...] oldest first
+        n = min(self.count, len(self._free))
+        res = []
+        for k in range(n - 1, -1, -1):
+            idx = (self._idx - k) % len(self._free)
+            res.append((self._free[idx], self._us[idx]))
+        return res
+
+    def report(self):
+        print('Collections {} deferred {} mean {}us max {}us allocation {} bytes/s'.format(
+            self.count, self.deferred, self.total_us // max(self.count, 1), self.max_us, self.rate))
+        for free, us in self.history():
+            print('mem_free {:7d}  {:6d}us'.format(free, us))
+
+    async def run(self):
+        self.collect()
+        delay = self.min_ms
+        while True:
+            await asyncio.sleep_ms(delay)
+            alloc = gc.mem_alloc()
+            if alloc < self._alloc: # Collected elsewhere
+                self._alloc = alloc
+                self._budget = gc.mem_free() // self.fraction
+                self._tcollect = ticks_ms()
+            allocated = alloc - self._alloc
+            dt = ticks_diff(ticks_ms(), self._tcollect)
+            if dt > 0:
+                self.rate = allocated * 1000 // dt
+            if allocated >= self._budget:
+                if not self.idle():
+                    self.deferred += 1
+                    delay = self.min_ms # Retry soon
+                    continue
+                self.collect()
+                allocated = 0
+            if self.rate > 0: # Check again when the budget is due to be used
+                delay = (self._budget - allocated) * 1000 // self.rate
+                delay = min(max(delay, self.min_ms), self.max_ms)
+            else:
+                delay = self.max_ms
+
+# A Style holds the colors, font and border width of GUI objects. Objects hold
+# a reference to a Style rather than copies of these values. Styles are
+# interned when objects are constructed: objects created with the same
+# appearance share one instance. Colors are interned too, so each distinct color
+# is one tuple and its greyed version is computed once (see TFT_G.greypalette).
+# As these tables grow only with the appearances in the program text they are
+# bounded. Assigning to a color attribute of an object at run time gives that
+# object a private, uninterned Style which later assignments modify in place,
+# so changing colors does not grow the tables or allocate repeatedly. Changing
+# a shared Style with set() changes the appearance of every object using it; it
+# is then no longer interned. Hot drawing paths should read the values from a
+# local reference to the Style rather than through the object's properties.
+class Style(object):
+    _styles = {} # (fgcolor, bgcolor, fontcolor, font, border): Style
+    _colors = {} # Interned colors
+    names = ('fgcolor', 'bgcolor', 'fontcolor', 'font', 'border')
+
+    @classmethod
+    def color(cls, color, intern=True): # Return color as a tuple, optionally interned
+        if color is None:
+            return None
+        if not isinstance(color, tuple): # e.g. list
+            color = tuple(color)
+        return cls._colors.setdefault(color, color) if intern else color
+
+    @classmethod
+    def get(cls, fgcolor, bgcolor, fontcolor, font, border):
+        fgcolor = cls.color(fgcolor)
+        bgcolor = cls.color(bgcolor)
+        fontcolor = cls.color(fontcolor)
+        key = (fgcolor, bgcolor, fontcolor, font, border)
+        style = cls._styles.get(key)
+        if style is None:
+            style = cls(fgcolor, bgcolor, fontcolor, font, border)
+            Screen.tft.greypalette(fgcolor, bgcolor, fontcolor)
+            cls._styles[key] = style
+        return style
+
+    def __init__(self, fgcolor, bgcolor, fontcolor, font, border):
+        self.fgcolor = fgcolor
+        self.bgcolor = bgcolor
+        self.fontcolor = fontcolor
+        self.font = font
+        self.border = border
+        self._owner = None # Object whose private Style this is
+
+    def _key(self):
+        return (self.fgcolor, self.bgcolor, self.fontcolor, self.font, self.border)
+
+    def _setvalue(self, name, value):
+        if name not in self.names:
+            raise ValueError('Invalid style attribute {}'.format(name))
+        setattr(self, name, value if name in ('font', 'border') else Style.color(value, False))
+
+    def _update(self, kwargs):
+        for name in kwargs:
+            self._setvalue(name, kwargs[name])
+
+    def replace(self, **kwargs): # Return an uninterned Style differing in the specified values
+        style = Style(self.fgcolor, self.bgcolor, self.fontcolor, self.font, self.border)
+        style._update(kwargs)
+        return style
+
+    def set(self, **kwargs): # Change this Style. Objects must be redrawn to show the change.
+        styles = Style._styles
+        key = self._key()
+        if styles.get(key) is self:
+            del styles[key] # Its users keep it: new objects get a new Style
+        self._update(kwargs)
+
+# Deferred dispatch of user callbacks. If Screen.dispatcher is assigned an
+# instance, callbacks arising from touches and value changes are queued and run
+# by the dispatcher's thread, so a slow callback does not hold up touch
+# processing or visual feedback. Value change callbacks from one object are
+# coalesced: a queued callback is replaced by a later one, provided that no
+# other callback from the object is queued after it. The queue is bounded:
+# if it is full the queued callbacks are run in order, then the new one, so
+# callbacks never run out of order. An exception in a callback is reported and
+# the dispatcher carries on. Telemetry: latency from queueing to execution and
+# time spent in callbacks. If Screen.latency is set each callback is marked in
+# the LatencyTrace record of the touch which queued it.
+class Dispatcher(object):
+    def __init__(self, maxlen=16):
+        self.maxlen = maxlen
+        self.count = 0 # Callbacks run
+        self.coalesced = 0 # Callbacks superseded by a later one
+        self.overflows = 0 # Times the queue was flushed because it was full
+        self.errors = 0 # Callbacks which raised an exception
+        self.total_latency_us = 0
+        self.max_latency_us = 0
+        self.total_us = 0 # Time spent in callbacks
+        self.max_us = 0
+        self._queue = [] # [func, obj, args, ticks_us() when queued, coalesce, LatencyTrace record]
+        self._event = Event()
+        create_task(self._run(), 'Dispatcher')
+
+    def call(self, func, obj, args, coalesce=False):
+        if func is dolittle:
+            return
+        trace = Screen.latency
+        rec = -1 if trace is None else trace.record()
+        if coalesce: # Only the latest entry from obj may be replaced
+            for entry in reversed(self._queue):
+                if entry[1] is obj:
+                    if entry[4]:
+                        entry[0] = func
+                        entry[2] = args
+                        entry[5] = rec # Now runs in response to the latest touch
+                        self.coalesced += 1
+                        return
+                    break
+        if len(self._queue) >= self.maxlen:
+            self.overflows += 1
+            self._flush()
+            self._execute(func, obj, args, ticks_us(), rec)
+        else:
+            self._queue.append([func, obj, args, ticks_us(), coalesce, rec])
+            self._event.set()
+
+    def _execute(self, func, obj, args, tqueued, rec):
+        trace = Screen.latency
+        if trace is not None:
+            trace.mark(trace.CB_START, rec)
+        start = ticks_us()
+        latency = ticks_diff(start, tqueued)
+        try:
+            func(obj, *args)
+        except Exception as e: # Later callbacks must still run
+            self.errors += 1
+            print('Exception in callback {}: {}'.format(func, repr(e)))
+        dt = ticks_diff(ticks_us(), start)
+        if trace is not None:
+            trace.mark(trace.CB_END, rec)
+        self.count += 1
+        self.total_latency_us += latency
+        self.max_latency_us = max(self.max_latency_us, latency)
+        self.total_us += dt
+        self.max_us = max(self.max_us, dt)
+
+    def _flush(self): # Run queued callbacks in order
+        while self._queue:
+            func, obj, args, tqueued, _, rec = self._queue.pop(0)
+            self._execute(func, obj, args, tqueued, rec)
+
+    def report(self):
+        n = max(self.count, 1)
+        print('Callbacks {} coalesced {} overflows {} errors {}'.format(
+              self.count, self.coalesced, self.overflows, self.errors))
+        print('Latency mean {}us max {}us'.format(self.total_latency_us // n, self.max_latency_us))
+        print('Duration mean {}us max {}us'.format(self.total_us // n, self.max_us))
+
+    async def _run(self):
+        while True:
+            await self._event
+            self._event.clear()
+            while self._queue:
+                func, obj, args, tqueued, _, rec = self._queue.pop(0)
+                self._execute(func, obj, args, tqueued, rec)
+                await asyncio.sleep_ms(0) # Allow touches to be processed between callbacks
+
+# Touch to pixel latency. Each touch read by the GUI starts a record holding the
+# time in us at which each stage was first reached, measured from the touch
+# driver's acceptance of the sample. Stages: read by the GUI, hit test of an
+# object, start and end of a user callback, first write to the display. The
+# latter is detected by a TFT_G probe: only a write whose window overlaps the
+# object touched counts, so unrelated redraws do not end the measurement.
+# Records are held in a ring buffer: -1 denotes a stage not reached. A record is
+# identified by its sequence number so that a deferred callback is marked in the
+# record of the touch which caused it, unless that has since been overwritten.
+# Assign an instance to Screen.latency after Screen.setup() to enable tracing.
+class LatencyTrace(object):
+    READ = 0
+    HIT = 1
+    CB_START = 2
+    CB_END = 3
+    PIXEL = 4
+    NSTAGES = 5
+    names = ('Read', 'Hit test', 'Callback start', 'Callback end', 'First pixel')
+
+    def __init__(self, nrecords=64):
+        self.nrecords = nrecords
+        self.count = 0 # Records started
+        self._data = array('i', (-1 for _ in range(nrecords * self.NSTAGES)))
+        self._t0 = [0] * nrecords # Start time of each record
+        self._box = None # Bounding box of object touched in latest record
+        Screen.tft.add_probe(self._probe)
+
+    def start(self, t_ready): # A touch has been read
+        idx = self.count % self.nrecords
+        base = idx * self.NSTAGES
+        for n in range(base, base + self.NSTAGES):
+            self._data[n] = -1
+        self._t0[idx] = t_ready
+        self._box = None
+        self.count += 1
+        self.mark(self.READ)
+
+    def record(self): # Sequence no. of the latest record, -1 if none
+        return self.count - 1
+
+    def mark(self, stage, rec=None): # Default: latest record
+        if rec is None:
+            rec = self.count - 1
+        if rec >= 0 and self.count - rec <= self.nrecords:
+            idx = rec % self.nrecords
+            n = idx * self.NSTAGES + stage
+            if self._data[n] < 0:
+                self._data[n] = ticks_diff(ticks_us(), self._t0[idx])
+
+    def hit(self, obj): # The latest touch lies on obj
+        if self._box is None:
+            x, y = obj.location
+            self._box = (x, y, x + obj.width, y + obj.height)
+        self.mark(self.HIT)
+
+    def last(self, stage): # Time in us of a stage in the latest record or -1
+        if not self.count:
+            return -1
+        return self._data[((self.count - 1) % self.nrecords) * self.NSTAGES + stage]
+
+    def _probe(self, x1, y1, x2, y2):
+        box = self._box
+        if box is not None and x1 <= box[2] and x2 >= box[0] and y1 <= box[3] and y2 >= box[1]:
+            self.mark(self.PIXEL)
+
+    def percentiles(self, stage, pcts=(50, 90, 99)): # Return a list of times in us or None
+        n = min(self.count, self.nrecords)
+        values = []
+        for rec in range(n):
+            v = self._data[rec * self.NSTAGES + stage]
+            if v >= 0:
+                values.append(v)
+        if not values:
+            return None
+        values.sort()
+        return [values[min(len(values) * p // 100, len(values) - 1)] for p in pcts]
+
+    def report(self):
+        print('Stage            p50 us  p90 us  p99 us')
+        for stage, name in enumerate(self.names):
+            res = self.percentiles(stage)
+            if res is None:
+                print('{:15s}  Not reached'.format(name))
+            else:
+                print('{:15s}  {:6d}  {:6d}  {:6d}'.format(name, *res))
+
 class Screen(object):
     current_screen = None
     tft = None
     objtouch = None
     is_shutdown = Event()
+    cache_size = 4 # Max no. of screens retained by change(..., cache=True)
+    max_depth = 0 # Max no. of screen instances on navigation stack. 0 == no limit
+    _cache = [] # [key, screen] pairs, least recently used first
+    stats = {} # Class name: [construction time ms, bytes allocated, redraw time ms]
+    gc_policy = None # A GCPolicy instance is created by the first Screen if not assigned
+    accounting = False # Record RAM retained by each object during screen construction
+    memstats = {} # Class name: [(object class name, bytes, data bytes, attributes), ...]
+    _acct = None # [(object, mem_alloc()), ...] while accounting
+    dispatcher = None # If a Dispatcher is assigned, user callbacks are deferred to its thread
+    latency = None # Optional LatencyTrace
 
     @classmethod
     def setup(cls, tft, objtouch):
@@ -195,13 +611,14 @@ class Screen(object):
     @classmethod
     def show(cls):
         for obj in cls.current_screen.displaylist:
+            obj._hidden_change = False
             if obj.visible: # In a buttonlist only show visible button
                 obj.redraw = True # Redraw static content
                 obj.draw_border()
                 obj.show()
 
     @classmethod
-    def change(cls, cls_new_screen, *, forward=True, args=[], kwargs={}):
+    def change(cls, cls_new_screen, *, forward=True, args=[], kwargs={}, cache=False):
         init = cls.current_screen is None
         if init:
             Screen() # Instantiate a blank starting screen
@@ -209,21 +626,132 @@ class Screen(object):
         cs_old.on_hide() # Optional method in subclass
         if forward:
             if type(cls_new_screen) is ClassType:
-                new_screen = cls_new_screen(*args, **kwargs) # Instantiate new screen
+                new_screen = cls._build(cls_new_screen, args, kwargs, cache, cs_old)
             else:
                 raise ValueError('Must pass Screen class or subclass (not instance)')
             new_screen.parent = cs_old
             cs_new = new_screen
+            cls._limit_depth(cs_new)
+        elif isinstance(cls_new_screen, tuple): # Evicted screen: rebuild it
+            cs_new = cls._build(*cls_new_screen[:4], cs_old)
+            cs_new.parent = cls_new_screen[4]
         else:
             cs_new = cls_new_screen # An object, not a class
         cls.current_screen = cs_new
         cs_new.on_open() # Optional subclass method
+        t = ticks_ms()
         cs_new._do_open(cs_old) # Clear and redraw
+        cls.stats.setdefault(type(cs_new).__name__, [0, 0, 0])[2] = ticks_diff(ticks_ms(), t)
         cs_new.after_open() # Optional subclass method
         if init:
             loop = asyncio.get_event_loop()
             loop.run_until_complete(Screen.monitor())
 
+# Return a new or cached instance of a Screen subclass. A cached screen retains
+# its objects and their state. It is not reused if already on the navigation
+# stack (or if its arguments are not hashable). The heap is collected before
+# the build only when accounting: otherwise the bytes allocated are approximate
+# as a collection may occur during it.
+    @classmethod
+    def _build(cls, cls_screen, args, kwargs, cache, cs_old):
+        key = None
+        if cache and cls.cache_size > 0:
+            try:
+                key = (cls_screen, tuple(args), tuple(sorted(kwargs.items())))
+                hash(key)
+            except TypeError:
+                key = None
+        if key is not None:
+            for n, entry in enumerate(cls._cache):
+                if entry[0] == key:
+                    screen = entry[1]
+                    s = cs_old
+                    while isinstance(s, Screen) and s is not screen:
+                        s = s.parent
+                    if s is screen:
+                        key = None # Already on stack: build a new instance
+                        break
+                    cls._cache.append(cls._cache.pop(n)) # Most recently used
+                    return screen
+        if cls.accounting:
+            gc.collect()
+        mem = gc.mem_alloc()
+        t = ticks_ms()
+        cls._acct = [(None, mem)] if cls.accounting else None
+        screen = cls_screen(*args, **kwargs) # Instantiate new screen
+        stats = cls.stats.setdefault(cls_screen.__name__, [0, 0, 0])
+        stats[0] = ticks_diff(ticks_ms(), t)
+        stats[1] = gc.mem_alloc() - mem
+        if cls._acct is not None:
+            cls._account(cls_screen.__name__, screen)
+        screen._recipe = (cls_screen, args, kwargs, cache)
+        if key is not None:
+            cls._cache.append([key, screen])
+            if len(cls._cache) > cls.cache_size:
+                cls._cache.pop(0)
+        return screen
+
+# Limit the number of screen instances on the navigation stack. Beyond the limit
+# a screen is replaced by the information needed to rebuild it: back() will
+# instantiate it again (or retrieve it from the cache).
+    @classmethod
+    def _limit_depth(cls, screen):
+        depth = 1
+        while cls.max_depth and isinstance(screen.parent, Screen):
+            parent = screen.parent
+            if depth >= cls.max_depth and parent._recipe is not None:
+                screen.parent = parent._recipe + (parent.parent,)
+                return
+            screen = parent
+            depth += 1
+
+    @classmethod
+    def report(cls):
+        print('Screen              Build ms  Bytes  Redraw ms')
+        for name, (ms, nbytes, rms) in cls.stats.items():
+            print('{:18s}  {:8d}  {:5d}  {:9d}'.format(name, ms, nbytes, rms))
+
+# Memory accounting. The RAM in use is recorded after a collection before each
+# object is allocated (see NoTouch.__new__): the difference is the RAM retained
+# by the object, including any buffers it allocated. Construction has no end
+# marker, so RAM retained by the screen's constructor before its first object
+# is attributed to the screen and anything retained after an object (by the
+# screen, or by a containing object after creating its children) is charged to
+# that object.
+    @classmethod
+    def _account(cls, name, screen):
+        gc.collect()
+        acct = cls._acct
+        cls._acct = None
+        acct.append((None, gc.mem_alloc()))
+        res = []
+        for n in range(len(acct) - 1):
+            obj = acct[n][0] if acct[n][0] is not None else screen
+            res.append((type(obj).__name__, acct[n + 1][1] - acct[n][1], data_bytes(obj), len(obj.__dict__)))
+        cls.memstats[name] = res
+
+    @classmethod
+    def memreport(cls):
+        for name, objs in cls.memstats.items():
+            print('{} {} bytes'.format(name, sum(obj[1] for obj in objs)))
+            print('  Object              Bytes   Data  Attributes')
+            for obj in objs:
+                print('  {:18s}  {:5d}  {:5d}  {:10d}'.format(*obj))
+
+# Run a user callback, or queue it if a Dispatcher is in use
+    @classmethod
+    def dispatch(cls, func, obj, args, coalesce=False):
+        if cls.dispatcher is None:
+            trace = cls.latency
+            if trace is not None and func is not dolittle:
+                trace.mark(trace.CB_START)
+                func(obj, *args)
+                trace.mark(trace.CB_END)
+            else:
+                func(obj, *args)
+        else:
+            cls.dispatcher.call(func, obj, args, coalesce)
+
     @classmethod
     async def monitor(cls):
         await cls.is_shutdown
@@ -252,11 +780,13 @@ class Screen(object):
         self.displaylist = []
         self.modal = False
         if Screen.current_screen is None: # Initialising class and thread
-            loop = asyncio.get_event_loop()
-            loop.create_task(self._touchtest()) # One thread only
-            loop.create_task(self._garbage_collect())
+            create_task(self._touchtest(), 'touchtest') # One thread only
+            if Screen.gc_policy is None:
+                Screen.gc_policy = GCPolicy()
+            create_task(Screen.gc_policy.run(), 'GCPolicy')
         Screen.current_screen = self
         self.parent = None
+        self._recipe = None # Set by change(): used to rebuild an evicted screen
 
     async def _touchtest(self): # Singleton thread tests all touchable instances
         touch_panel = Screen.objtouch
@@ -264,6 +794,8 @@ class Screen(object):
             await asyncio.sleep_ms(0)
             if touch_panel.ready:
                 x, y = touch_panel.get_touch_async()
+                if Screen.latency is not None:
+                    Screen.latency.start(touch_panel.t_ready)
                 for obj in Screen.current_screen.touchlist:
                     if obj.visible and not obj.greyed_out():
                         obj._trytouch(x, y)
@@ -278,15 +810,25 @@ class Screen(object):
         show_all = True
         tft = Screen.get_tft()
 # If opening a Screen from an Aperture just blank and redraw covered area
+# unless the Aperture saved the pixels it covered. Objects whose value changed
+# while hidden are redrawn in either case.
         if old_screen.modal:
             show_all = False
             x0, y0, x1, y1 = old_screen._list_dims()
-            tft.fill_rectangle(x0, y0, x1, y1, tft.getBGColor()) # Blank to screen BG
-            for obj in [z for z in self.displaylist if z.overlaps(x0, y0, x1, y1)]:
-                if obj.visible:
+            restored = False
+            if old_screen.parent is self:
+                if any(z._hidden_change for z in self.displaylist if z.overlaps(x0, y0, x1, y1)):
+                    old_screen._discard() # Saved pixels are out of date
+                else:
+                    restored = old_screen._restore()
+            if not restored:
+                tft.fill_rectangle(x0, y0, x1, y1, tft.getBGColor()) # Blank to screen BG
+            for obj in self.displaylist:
+                if obj.visible and (obj._hidden_change or (not restored and obj.overlaps(x0, y0, x1, y1))):
                     obj.redraw = True # Redraw static content
                     obj.draw_border()
                     obj.show()
+                obj._hidden_change = False
 # Normally clear the screen and redraw everything
         else:
             tft.clrSCR()
@@ -301,22 +843,27 @@ class Screen(object):
     def on_hide(self): # Optionally implemented in subclass
         return
 
-    async def _garbage_collect(self):
-        while True:
-            await asyncio.sleep_ms(100)
-            gc.collect()
-            gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
-
 # Very basic window class. Cuts a rectangular hole in a screen on which content may be drawn
+# If save_under is True an Aperture reads back the pixels it covers and writes
+# them back on closure, avoiding the redraw of overlapped objects. The pixels
+# are held in RAM if they fit in save_budget bytes, otherwise in save_file in
+# chunks of up to chunk_bytes. One Aperture at a time may use the file. If the
+# pixels cannot be saved, overlapped objects are redrawn as normal.
 class Aperture(Screen):
     _value = None
-    def __init__(self, location, height, width, *, draw_border=True, bgcolor=None, fgcolor=None):
+    save_budget = 16384 # Max bytes of RAM for saved pixels
+    save_file = None # Scratch file for larger Apertures e.g. '/sd/aperture.bin'
+    chunk_bytes = 1920
+    _file_owner = None
+    def __init__(self, location, height, width, *, draw_border=True, bgcolor=None, fgcolor=None, save_under=False):
         Screen.__init__(self)
         self.location = location
         self.height = height
         self.width = width
         self.draw_border = draw_border
         self.modal = True
+        self.save_under = save_under
+        self._saved = None # (buffer, in_file) while pixels are saved
         tft = Screen.get_tft()
         self.fgcolor = fgcolor if fgcolor is not None else tft.getColor()
         self.bgcolor = bgcolor if bgcolor is not None else tft.getBGColor()
@@ -326,12 +873,69 @@ class Aperture(Screen):
 
     def _do_open(self, old_screen):
         tft = Screen.get_tft()
+        if old_screen.modal and old_screen.parent is self:
+            old_screen._restore() # Closing a nested Aperture
+        elif self.save_under and self._saved is None:
+            self._save()
         x, y = self.location[0], self.location[1]
         tft.fill_rectangle(x, y, x + self.width, y + self.height, self.bgcolor)
         if self.draw_border:
             tft.draw_rectangle(x, y, x + self.width, y + self.height, self.fgcolor)
         Screen.show()
 
+    def _save(self):
+        tft = Screen.get_tft()
+        x0, y0, x1, y1 = self._list_dims()
+        w = x1 - x0 + 1
+        h = y1 - y0 + 1
+        try:
+            if w * h * 3 <= Aperture.save_budget:
+                buf = bytearray(w * h * 3)
+                tft.readBitmap(x0, y0, w, h, buf)
+                self._saved = (buf, False)
+            elif Aperture.save_file is not None and Aperture._file_owner is None:
+                rows = max(min(Aperture.chunk_bytes // (w * 3), h), 1)
+                buf = bytearray(rows * w * 3)
+                mvb = memoryview(buf)
+                with open(Aperture.save_file, 'wb') as f:
+                    for y in range(y0, y1 + 1, rows):
+                        n = min(rows, y1 + 1 - y)
+                        tft.readBitmap(x0, y, w, n, mvb[: n * w * 3])
+                        f.write(mvb[: n * w * 3])
+                self._saved = (buf, True)
+                Aperture._file_owner = self
+        except (MemoryError, OSError):
+            self._saved = None
+
+    def _restore(self): # Write back saved pixels. Return True on success.
+        if self._saved is None:
+            return False
+        buf, in_file = self._saved
+        self._discard()
+        tft = Screen.get_tft()
+        x0, y0, x1, y1 = self._list_dims()
+        w = x1 - x0 + 1
+        h = y1 - y0 + 1
+        if not in_file:
+            tft.writeBitmap(x0, y0, w, h, buf)
+            return True
+        rows = len(buf) // (w * 3)
+        mvb = memoryview(buf)
+        try:
+            with open(Aperture.save_file, 'rb') as f:
+                for y in range(y0, y1 + 1, rows):
+                    n = min(rows, y1 + 1 - y)
+                    f.readinto(mvb[: n * w * 3])
+                    tft.writeBitmap(x0, y, w, n, mvb[: n * w * 3])
+        except OSError:
+            return False
+        return True
+
+    def _discard(self):
+        if Aperture._file_owner is self:
+            Aperture._file_owner = None
+        self._saved = None
+
     def _list_dims(self):
         x0 = self.location[0]
         x1 = self.location[0] + self.width
@@ -347,6 +951,17 @@ class Aperture(Screen):
 
 # Base class for all displayable objects
 class NoTouch(object):
+    _direct = False # Callbacks are not deferred
+    def __new__(cls, *args, **kwargs):
+        acct = Screen._acct
+        if acct is not None: # Accounting: mark the start of construction
+            gc.collect()
+            mem = gc.mem_alloc()
+            obj = object.__new__(cls)
+            acct.append((obj, mem))
+            return obj
+        return object.__new__(cls)
+
     def __init__(self, location, font, height, width, fgcolor, bgcolor, fontcolor, border, value, initial_value):
         Screen.addobject(self)
         self.screen = Screen.current_screen
@@ -354,17 +969,17 @@ class NoTouch(object):
         self.location = location
         self._value = value
         self._initial_value = initial_value # Optionally enables show() method to handle initialisation
-        self.font = font
         self.height = height
         self.width = width
         self.fill = bgcolor is not None
         self.visible = True # Used by ButtonList class for invisible buttons
+        self._hidden_change = False # Value changed while screen not current
         self._greyed_out = False # Disabled by user code
         tft = Screen.get_tft(False) # Not greyed out
-        self.fgcolor = fgcolor if fgcolor is not None else tft.getColor()
-        self.bgcolor = bgcolor if bgcolor is not None else tft.getBGColor()
-        self.fontcolor = fontcolor if fontcolor is not None else tft.getColor()
-        self.border = 0 if border is None else int(max(border, 0)) # width
+        self.style = Style.get(fgcolor if fgcolor is not None else tft.getColor(),
+                               bgcolor if bgcolor is not None else tft.getBGColor(),
+                               fontcolor if fontcolor is not None else tft.getColor(),
+                               font, 0 if border is None else int(max(border, 0))) # border width
         self.callback = dolittle # Value change callback
         self.args = []
         self.cb_end = dolittle # Touch release callbacks
@@ -374,6 +989,63 @@ class NoTouch(object):
     def tft(self):
         return Screen.get_tft(self._greyed_out)
 
+# Callbacks assigned by ugui itself to its own objects run at once: _direct
+# is then set. User callbacks may be deferred by a Dispatcher.
+    def _do_callback(self, func, args, coalesce=False):
+        if self._direct:
+            func(self, *args)
+        else:
+            Screen.dispatch(func, self, args, coalesce)
+
+# Appearance is held in a shared Style. Assignment gives this object its own.
+    def _restyle(self, name, value):
+        style = self.style
+        if style._owner is not self:
+            style = style.replace()
+            style._owner = self
+            self.style = style
+        style._setvalue(name, value)
+
+    @property
+    def fgcolor(self):
+        return self.style.fgcolor
+
+    @fgcolor.setter
+    def fgcolor(self, color):
+        self._restyle('fgcolor', color)
+
+    @property
+    def bgcolor(self):
+        return self.style.bgcolor
+
+    @bgcolor.setter
+    def bgcolor(self, color):
+        self._restyle('bgcolor', color)
+
+    @property
+    def fontcolor(self):
+        return self.style.fontcolor
+
+    @fontcolor.setter
+    def fontcolor(self, color):
+        self._restyle('fontcolor', color)
+
+    @property
+    def font(self):
+        return self.style.font
+
+    @font.setter
+    def font(self, font):
+        self._restyle('font', font)
+
+    @property
+    def border(self):
+        return self.style.border
+
+    @border.setter
+    def border(self, border):
+        self._restyle('border', border)
+
     def greyed_out(self):
         return self._greyed_out # Subclass may be greyed out
 
@@ -387,13 +1059,15 @@ class NoTouch(object):
         return self._value
 
     def _value_change(self, show): # Optional override in subclass
-        self.callback(self, *self.args) # CB is not a bound method. 1st arg is self
+        self._do_callback(self.callback, self.args, True) # CB is not a bound method. 1st arg is self
         if show:
             self.show_if_current()
 
     def show_if_current(self):
         if self.screen is Screen.current_screen:
             self.show()
+        else:
+            self._hidden_change = True
 
 # Called by Screen.show(). Draw background and bounding box if required
     def draw_border(self):
@@ -446,24 +1120,179 @@ class Touchable(NoTouch):
         y1 = self.location[1] + self.height
         if x0 <= x <= x1 and y0 <= y <= y1:
             self.was_touched = True
+            if Screen.latency is not None:
+                Screen.latency.hit(self)
             if not self.busy or self.can_drag:
                 self._touched(x, y) # Called repeatedly for draggable objects
                 self.busy = True # otherwise once only
 
     def _untouched(self): # Default if not defined in subclass
-        self.cb_end(self, *self.cbe_args) # Callback not a bound method so pass self
+        self._do_callback(self.cb_end, self.cbe_args) # Callback not a bound method so pass self
+
+    def pressure(self): # Pressure of latest touch sample. 0 unless touch driver qualifies pressure.
+        return Screen.objtouch.z
 
 # *********** DISPLAYS: NON-TOUCH CLASSES FOR DATA DISPLAY ***********
 
+# Label records the string it last drew and the x offset of each glyph. On a
+# change of value only glyphs which differ in character or position are
+# repainted, plus the strip vacated by a shorter string. If fixed_digits is
+# set each digit occupies a cell as wide as the widest digit in the font so
+# that numbers do not shift sideways.
 class Label(NoTouch):
-    def __init__(self, location, *, font, border=None, width=None, fgcolor=None, bgcolor=None, fontcolor=None, value=None):
+    def __init__(self, location, *, font, border=None, width=None, fgcolor=None, bgcolor=None, fontcolor=None, value=None,
+                 fixed_digits=False):
+        self._cell = max(font.get_ch(d)[2] for d in '0123456789') if fixed_digits else 0
         if width is None:
             if value is None:
                 raise ValueError('If label value unspecified, must define the width')
             width, _ = get_stringsize(value, font) 
+            if fixed_digits:
+                width += sum(self._cell - font.get_ch(c)[2] for c in value if '0' <= c <= '9')
         super().__init__(location, font, None, width, fgcolor, bgcolor, fontcolor, border, value, None)
         self.height = self.font.height()
         self.height += 2 * self.border  # Height determined by font and border
+        self._drawn = '' # String currently displayed
+        self._xoffs = [] # x offsets of its glyphs and of its end
+
+    def _offsets(self, s, x, gap): # x offsets of glyphs in s and of its end
+        font = self.style.font
+        offs = [x]
+        cell = self._cell
+        for c in s:
+            if cell and '0' <= c <= '9':
+                x += cell + gap
+            else:
+                x += font.get_ch(c)[2] + gap
+            offs.append(x)
+        return offs
+
+    def show(self):
+        style = self.style
+        tft = self.tft
+        bw = style.border
+        x = self.location[0]
+        y = self.location[1]
+        xe = x + self.width - bw # Right hand edge of text field
+        ye = y + self.height - bw
+        s = self._value if self._value is not None else ''
+        old_style = tft.getTextStyle()
+        tft.setTextStyle(style.fontcolor, None, 2, style.font)
+        offs = self._offsets(s, x + bw, old_style[4])
+        old = self._drawn
+        oldoffs = self._xoffs
+        if self.redraw or not oldoffs:
+            tft.fill_rectangle(x + bw, y + bw, xe, ye, style.bgcolor)
+            old = ''
+            self.redraw = False
+        for n, c in enumerate(s):
+            xs = offs[n]
+            if xs > xe:
+                break
+            if n < len(old) and old[n] == c and oldoffs[n] == xs:
+                continue # Glyph unchanged
+            if old: # Blank the glyph's cell
+                tft.fill_rectangle(xs, y + bw, min(offs[n + 1] - 1, xe), ye, style.bgcolor)
+            if self._cell and '0' <= c <= '9': # Centre digit in its cell
+                xs += (self._cell - style.font.get_ch(c)[2]) // 2
+            tft.setTextPos(xs, y + bw, max(xe - xs, 1), False)
+            tft.printChar(c)
+        if old and offs[-1] < oldoffs[-1]: # Blank vacated strip
+            tft.fill_rectangle(offs[-1], y + bw, min(oldoffs[-1] - 1, xe), ye, style.bgcolor)
+        tft.setTextStyle(*old_style)
+        self._drawn = s
+        self._xoffs = offs
+
+# NumericDisplay shows an integer or fixed point number in ndigits character
+# cells. Integer values are formatted into a preallocated bytearray and drawn
+# from a table of glyph addresses: only cells whose character has changed are
+# redrawn and no memory is allocated. An integer n with decimals = d displays
+# n / 10**d. Floats are also accepted but their conversion allocates.
+class NumericDisplay(NoTouch):
+    charset = '0123456789-. '
+    def __init__(self, location, *, font, ndigits=6, decimals=0, border=None,
+                 fgcolor=None, bgcolor=None, fontcolor=None, value=None):
+        gap = 1
+        cell = max(font.get_ch(c)[2] for c in '0123456789-') + gap
+        bw = border if border is not None else 0
+        super().__init__(location, font, font.height() + 2 * bw, ndigits * cell + 2 * bw,
+                         fgcolor, bgcolor, fontcolor, border, None, None)
+        self.decimals = decimals
+        self._scale = 10 ** decimals
+        self._cell = cell
+        self._glyphs = {}
+        bufsize = 0
+        for c in self.charset:
+            fmv, rows, cols = font.get_ch(c)
+            dcols = (cols + 7) & ~7
+            addr = addressof(fmv) if c != ' ' else 0
+            self._glyphs[ord(c)] = (addr, rows, dcols, (cell - cols) // 2)
+            bufsize = max(bufsize, rows * dcols * 3)
+        self._bg_buf = bytearray(bufsize)
+        self._buf = bytearray(b' ' * ndigits) # Formatted value
+        self._shown = bytearray(ndigits) # Currently displayed
+        self._control = None
+        self._bgvect = None
+        if value is not None:
+            self.value(value)
+
+    def value(self, val=None):
+        if val is not None and val != self._value:
+            self._value = val
+            if type(val) is float:
+                val = int(round(val * self._scale))
+            self._format(val)
+            if self.screen is not Screen.current_screen:
+                self._hidden_change = True
+            elif self._control is not None: # Has been shown
+                self._update()
+        return self._value
+
+    def _format(self, n):
+        buf = self._buf
+        neg = n < 0
+        if neg:
+            n = -n
+        pos = len(buf)
+        dp = self.decimals
+        while True: # Digits, right to left
+            pos -= 1
+            if pos < 0:
+                break
+            if dp == 0 and self.decimals:
+                buf[pos] = 0x2e # '.'
+                dp = -1
+                continue
+            buf[pos] = 0x30 + n % 10
+            n //= 10
+            dp -= 1
+            if dp < 0 and n == 0:
+                break
+        if neg:
+            pos -= 1
+            if pos >= 0:
+                buf[pos] = 0x2d # '-'
+        if pos < 0: # Overflow
+            for pos in range(len(buf)):
+                buf[pos] = 0x2d
+        else:
+            while pos > 0:
+                pos -= 1
+                buf[pos] = 0x20
+
+    def _update(self): # Draw changed cells
+        tft = self.tft
+        buf = self._buf
+        shown = self._shown
+        x = self.location[0] + self.border
+        y = self.location[1] + self.border
+        cw = self._cell
+        glyphs = self._glyphs
+        for n in range(len(buf)):
+            c = buf[n]
+            if c != shown[n]:
+                tft.drawGlyph(x + n * cw, y, cw, glyphs[c], self._control, self._bgvect, self._bg_buf)
+                shown[n] = c
 
     def show(self):
         tft = self.tft
@@ -471,10 +1300,156 @@ class Label(NoTouch):
         x = self.location[0]
         y = self.location[1]
         tft.fill_rectangle(x + bw, y + bw, x + self.width - bw, y + self.height - bw, self.bgcolor)
-        if self._value is not None:
-            print_left(tft, x + bw, y + bw, self._value, self.fontcolor, self.font, self.width - 2 * bw)
+        self._bgvect = bytearray(self.bgcolor)
+        self._control = bytearray(self.bgcolor) + bytearray(self.fontcolor) + bytearray([2])
+        for n in range(len(self._shown)):
+            self._shown[n] = 0 # Force redraw of all cells
+        self._update()
+
+# TaskMonitor is an overlay showing the output of an asyn.Profiler: the loop
+# idle percentage and the busiest ntasks tasks with their load over the last
+# period. It comprises Labels. One thread, created with the first instance,
+# updates the monitor on the current screen, if any, once per profiler period.
+class TaskMonitor(object):
+    _running = False
+
+    def __init__(self, location, *, font, profiler, ntasks=3, width=160, border=None,
+                 fgcolor=None, bgcolor=None, fontcolor=None):
+        self.profiler = profiler
+        x, y = location
+        self.labels = []
+        for n in range(ntasks + 1):
+            lbl = Label((x, y), font = font, width = width, border = border, fgcolor = fgcolor,
+                        bgcolor = bgcolor, fontcolor = fontcolor)
+            self.labels.append(lbl)
+            y += lbl.height
+        Screen.current_screen.taskmonitor = self
+        if not TaskMonitor._running:
+            TaskMonitor._running = True
+            create_task(TaskMonitor._run(profiler.period_ms), 'TaskMonitor')
+
+    @staticmethod
+    async def _run(period_ms):
+        while True:
+            await asyncio.sleep_ms(period_ms)
+            monitor = getattr(Screen.current_screen, 'taskmonitor', None)
+            if monitor is None:
+                continue
+            profiler = monitor.profiler
+            labels = monitor.labels
+            labels[0].value('Idle {:3d}%'.format(profiler.idle))
+            top = profiler.top(len(labels) - 1)
+            for n, lbl in enumerate(labels[1:]):
+                lbl.value('{:12s}{:3d}%'.format(top[n][1][:12], top[n][0]) if n < len(top) else '')
+
+# PerfHUD shows live performance figures. Display writes are detected by a
+# TFT_G probe on setXY. A frame is a burst of writes separated by less than
+# gap_ms: its redraw time runs from the first write to the last. Bus pixels are
+# estimated from the windows set by setXY. Touch latency (to the first pixel) is
+# shown if Screen.latency is set. GC pause is the latest collection by
+# Screen.gc_policy. Measurement and the update thread are created with the first
+# instance and shared: every period_ms the HUD on the current screen, if any, is
+# updated. Each figure is a NumericDisplay, so only changed digits are redrawn;
+# the HUD's own drawing is not counted.
+class PerfHUD(object):
+    captions = ('FPS', 'Redraw ms', 'Max ms', 'Pixels/s', 'Touch ms', 'mem_free', 'GC ms')
+    period_ms = 1000
+    gap_ms = 5
+    frames = 0 # Total frames
+    last_us = 0 # Latest redraw time
+    max_us = 0
+    _running = False
+    _updating = False
+    _frames = 0 # This period
+    _pixels = 0
+    _tstart = None # Start of current frame
+    _tlast = 0 # Latest write
+    _tperiod = 0
+
+    def __init__(self, location, *, font, ndigits=7, border=None, fgcolor=None, bgcolor=None, fontcolor=None):
+        x, y = location
+        xn = x + max(get_stringsize(c, font)[0] for c in self.captions) + 4
+        self.displays = []
+        for caption in self.captions:
+            Label((x, y), font = font, fontcolor = fontcolor, value = caption)
+            nd = NumericDisplay((xn, y), font = font, ndigits = ndigits,
+                                decimals = 0 if caption in ('Pixels/s', 'mem_free') else 1,
+                                border = border, fgcolor = fgcolor, bgcolor = bgcolor, fontcolor = fontcolor)
+            self.displays.append(nd)
+            y += nd.height
+        Screen.current_screen.perfhud = self
+        cls = PerfHUD
+        if not cls._running:
+            cls._running = True
+            Screen.tft.add_probe(cls._probe)
+            cls._tperiod = ticks_us()
+            create_task(cls._run(), 'PerfHUD')
+
+    @classmethod
+    def _probe(cls, x1, y1, x2, y2):
+        if cls._updating:
+            return
+        t = ticks_us()
+        if cls._tstart is None:
+            cls._tstart = t
+        elif ticks_diff(t, cls._tlast) > cls.gap_ms * 1000:
+            cls._end_frame()
+            cls._tstart = t
+        cls._tlast = t
+        cls._pixels += (x2 - x1 + 1) * (y2 - y1 + 1)
+
+    @classmethod
+    def _end_frame(cls):
+        dt = ticks_diff(cls._tlast, cls._tstart)
+        cls.last_us = dt
+        cls.max_us = max(cls.max_us, dt)
+        cls.frames += 1
+        cls._frames += 1
+        cls._tstart = None
+
+    @classmethod
+    def reset(cls):
+        cls.frames = 0
+        cls.max_us = 0
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            await asyncio.sleep_ms(cls.period_ms)
+            t = ticks_us()
+            dt_ms = max(ticks_diff(t, cls._tperiod) // 1000, 1)
+            cls._tperiod = t
+            if cls._tstart is not None and ticks_diff(t, cls._tlast) > cls.gap_ms * 1000:
+                cls._end_frame()
+            frames = cls._frames
+            pixels = cls._pixels
+            cls._frames = 0
+            cls._pixels = 0
+            hud = getattr(Screen.current_screen, 'perfhud', None)
+            if hud is None:
+                continue
+            nd = hud.displays
+            cls._updating = True
+            try:
+                nd[0].value(frames * 10000 // dt_ms)
+                nd[1].value(cls.last_us // 100)
+                nd[2].value(cls.max_us // 100)
+                nd[3].value(pixels * 1000 // dt_ms)
+                trace = Screen.latency
+                if trace is not None:
+                    us = trace.last(trace.PIXEL)
+                    if us >= 0:
+                        nd[4].value(us // 100)
+                nd[5].value(gc.mem_free())
+                if Screen.gc_policy is not None:
+                    nd[6].value(Screen.gc_policy.last_us // 100)
+            finally:
+                cls._updating = False
 
 # class displays angles. Angle 0 is vertical, +ve increments are clockwise.
+# The static layer (ticks and circle) is drawn only when redraw is set. A
+# change to one pointer erases and redraws that pointer alone, then repairs
+# the ticks, circle and parts of other pointers which the erased line crossed.
 class Dial(NoTouch):
     def __init__(self, location, *, height=100, fgcolor=None, bgcolor=None, border=None, pointers=(0.9,), ticks=4):
         NoTouch.__init__(self, location, None, height, height, fgcolor, bgcolor, None, border, 0, 0) # __super__ provoked Python bug
@@ -482,42 +1457,78 @@ class Dial(NoTouch):
         radius = height / 2 - border
         self.radius = radius
         self.ticks = ticks
+        self.ticklen = 0.1 * radius
         self.xorigin = location[0] + border + radius
         self.yorigin = location[1] + border + radius
         self.pointers = tuple(z * self.radius for z in pointers) # Pointer lengths
-        self.angles = [None for _ in pointers]
-        self.new_value = None
+        self.angles = [None for _ in pointers] # Required angles
+        self._drawn = [None for _ in pointers] # Angles currently displayed
 
     def show(self):
         tft = self.tft
-        ticks = self.ticks
-        radius = self.radius
-        ticklen = 0.1 * radius
-        for tick in range(ticks):
-            theta = 2 * tick * math.pi / ticks
-            x_start = int(self.xorigin + radius * math.sin(theta))
-            y_start = int(self.yorigin - radius * math.cos(theta))
-            x_end = int(self.xorigin + (radius - ticklen) * math.sin(theta))
-            y_end = int(self.yorigin - (radius - ticklen) * math.cos(theta))
-            tft.draw_line(x_start, y_start, x_end, y_end, self.fgcolor)
-        tft.draw_circle(self.xorigin, self.yorigin, radius, self.fgcolor)
-        for idx, ang in enumerate(self.angles):
-            if ang is not None:
-                self._drawpointer(ang, idx, self.bgcolor) # erase old
-        if self.new_value is not None:
-            self.angles[self.new_value[1]] = self.new_value[0]
-            self.new_value = None
-
-        for idx, ang in enumerate(self.angles):
-            if ang is not None:
-                self._drawpointer(ang, idx, self.fgcolor)
+        if self.redraw: # Static layer and all pointers
+            self.redraw = False
+            for tick in range(self.ticks):
+                self._drawtick(tick)
+            tft.draw_circle(self.xorigin, self.yorigin, self.radius, self.fgcolor)
+            for idx, ang in enumerate(self._drawn):
+                if ang is not None:
+                    self._drawpointer(ang, idx, self.bgcolor) # erase old
+            for idx, ang in enumerate(self.angles):
+                if ang is not None:
+                    self._drawpointer(ang, idx, self.fgcolor)
+                self._drawn[idx] = ang
+        else:
+            for idx, ang in enumerate(self.angles):
+                if ang != self._drawn[idx]:
+                    self._update(idx)
 
     def value(self, angle, pointer=0):
-        if pointer > len(self.pointers):
+        if pointer >= len(self.pointers):
             raise ValueError('pointer index out of range')
-        self.new_value = [angle, pointer]
+        self.angles[pointer] = angle
         self.show_if_current()
 
+    def _update(self, idx): # Move one pointer
+        old = self._drawn[idx]
+        if old is not None:
+            self._drawpointer(old, idx, self.bgcolor) # erase old
+            self._repair(old, idx)
+        new = self.angles[idx]
+        if new is not None:
+            self._drawpointer(new, idx, self.fgcolor)
+        self._drawn[idx] = new
+
+    def _repair(self, radians, idx): # Redraw anything crossed by erased pointer
+        length = self.pointers[idx]
+        r_inner = self.radius - self.ticklen
+        if length >= r_inner - 1:
+            for tick in range(self.ticks):
+                delta = radians - 2 * tick * math.pi / self.ticks
+                if math.cos(delta) > 0 and abs(math.sin(delta)) * r_inner < 2:
+                    self._drawtick(tick)
+        if length >= self.radius - 1:
+            self.tft.draw_circle(self.xorigin, self.yorigin, self.radius, self.fgcolor)
+        # Pointers share the origin pixel. Those less than 90 degrees apart may
+        # share more: redraw them whole since a partial line may differ in its pixels.
+        x = int(self.xorigin)
+        y = int(self.yorigin)
+        for j, ang in enumerate(self._drawn):
+            if j != idx and ang is not None:
+                if math.cos(ang - radians) > 0:
+                    self._drawpointer(ang, j, self.fgcolor)
+                else:
+                    self.tft.draw_line(x, y, x, y, self.fgcolor)
+
+    def _drawtick(self, tick):
+        radius = self.radius
+        theta = 2 * tick * math.pi / self.ticks
+        x_start = int(self.xorigin + radius * math.sin(theta))
+        y_start = int(self.yorigin - radius * math.cos(theta))
+        x_end = int(self.xorigin + (radius - self.ticklen) * math.sin(theta))
+        y_end = int(self.yorigin - (radius - self.ticklen) * math.cos(theta))
+        self.tft.draw_line(x_start, y_start, x_end, y_end, self.fgcolor)
+
     def _drawpointer(self, radians, pointer, color):
         tft = self.tft
         length = self.pointers[pointer]
@@ -561,33 +1572,37 @@ class Meter(NoTouch):
         self.legends = legends
         self.pointercolor = pointercolor if pointercolor is not None else self.fgcolor
         self.ptr_y = None # Invalidate old position
+        # Static geometry
+        height = self.y1 - self.y0
+        self._height = height
+        self._ticks = array('h')
+        if divisions > 0:
+            dy = height / (divisions) # Tick marks
+            self._ticks = array('h', [int(self.y0 + dy * tick) for tick in range(divisions + 1)])
+        self._legend_y = array('h')
+        if legends is not None and font is not None:
+            dy = 0 if len(legends) <= 1 else height / (len(legends) -1)
+            yl = self.y1 # Start at bottom
+            for _ in legends:
+                self._legend_y.append(int(yl))
+                yl -= dy
+        self._legend_x = int(self.x0 + self.width /2)
 
     def show(self):
         tft = self.tft
         width = self.width
-        dx = 5
         x0 = self.x0
         x1 = self.x1
-        y0 = self.y0
-        y1 = self.y1
-        height = y1 - y0
-        if self.divisions > 0:
-            dy = height / (self.divisions) # Tick marks
-            for tick in range(self.divisions + 1):
-                ypos = int(y0 + dy * tick)
+        if self.redraw: # Static: the pointer saves and restores the pixels beneath it
+            self.redraw = False
+            dx = 5
+            for ypos in self._ticks:
                 tft.draw_hline(x0, ypos, dx, self.fgcolor)
                 tft.draw_hline(x1 - dx, ypos, dx, self.fgcolor)
+            for n, yl in enumerate(self._legend_y):
+                print_centered(tft, self._legend_x, yl, self.legends[n], self.fontcolor, self.font)
 
-        if self.legends is not None and self.font is not None: # Legends
-            if len(self.legends) <= 1:
-                dy = 0
-            else:
-                dy = height / (len(self.legends) -1)
-            yl = self.y1 # Start at bottom
-            for legend in self.legends:
-                print_centered(tft, int(self.x0 + self.width /2), int(yl), legend, self.fontcolor, self.font)
-                yl -= dy
-
+        height = self._height
         if self.ptr_y is not None: # Restore background if it was saved
             tft.setXY(x0, self.ptr_y, x1, self.ptr_y)
             TFT_io.tft_write_data_AS(self.ptrbuf, self.ptrbytes)
@@ -644,46 +1659,47 @@ class Button(Touchable):
         self.onrelease = onrelease
         self.lp_callback = lp_callback
         self.lp_args = lp_args
-        self.lp = False # Long press not in progress
+        self.lpdelay = Delay_ms(self.longpress) # Long press timer
         self.orig_fgcolor = fgcolor
         if self.litcolor is not None:
             self.delay = Delay_ms(self.shownormal)
         self.litcolor = litcolor if self.fgcolor is not None else None
 
     def show(self):
+        style = self.style
         tft = self.tft
         x = self.location[0]
         y = self.location[1]
         if not self.visible:   # erase the button
             tft.usegrey(False)
-            tft.fill_rectangle(x, y, x + self.width, y + self.height, self.bgcolor)
+            tft.fill_rectangle(x, y, x + self.width, y + self.height, style.bgcolor)
             return
         if self.shape == CIRCLE:  # Button coords are of top left corner of bounding box
             x += self.radius
             y += self.radius
             if self.fill:
-                tft.fill_circle(x, y, self.radius, self.fgcolor)
+                tft.fill_circle(x, y, self.radius, style.fgcolor)
             else:
-                tft.draw_circle(x, y, self.radius, self.fgcolor)
-            if self.font is not None and len(self.text):
-                print_centered(tft, x, y, self.text, self.fontcolor, self.font)
+                tft.draw_circle(x, y, self.radius, style.fgcolor)
+            if style.font is not None and len(self.text):
+                print_centered(tft, x, y, self.text, style.fontcolor, style.font)
         else:
             x1 = x + self.width
             y1 = y + self.height
             if self.shape == RECTANGLE: # rectangle
                 if self.fill:
-                    tft.fill_rectangle(x, y, x1, y1, self.fgcolor)
+                    tft.fill_rectangle(x, y, x1, y1, style.fgcolor)
                 else:
-                    tft.draw_rectangle(x, y, x1, y1, self.fgcolor)
-                if self.font  is not None and len(self.text):
-                    print_centered(tft, (x + x1) // 2, (y + y1) // 2, self.text, self.fontcolor, self.font)
+                    tft.draw_rectangle(x, y, x1, y1, style.fgcolor)
+                if style.font  is not None and len(self.text):
+                    print_centered(tft, (x + x1) // 2, (y + y1) // 2, self.text, style.fontcolor, style.font)
             elif self.shape == CLIPPED_RECT: # clipped rectangle
                 if self.fill:
-                    tft.fill_clipped_rectangle(x, y, x1, y1, self.fgcolor)
+                    tft.fill_clipped_rectangle(x, y, x1, y1, style.fgcolor)
                 else:
-                    tft.draw_clipped_rectangle(x, y, x1, y1, self.fgcolor)
-                if self.font  is not None and len(self.text):
-                    print_centered(tft, (x + x1) // 2, (y + y1) // 2, self.text, self.fontcolor, self.font)
+                    tft.draw_clipped_rectangle(x, y, x1, y1, style.fgcolor)
+                if style.font  is not None and len(self.text):
+                    print_centered(tft, (x + x1) // 2, (y + y1) // 2, self.text, style.fontcolor, style.font)
 
     def shownormal(self):
         self.fgcolor = self.orig_fgcolor
@@ -695,21 +1711,17 @@ class Button(Touchable):
             self.show() # must be on current screen
             self.delay.trigger(Button.lit_time)
         if self.lp_callback is not None:
-            loop = asyncio.get_event_loop()
-            loop.create_task(self.longpress())
+            self.lpdelay.trigger(self.long_press_time)
         if not self.onrelease:
-            self.callback(self, *self.callback_args) # Callback not a bound method so pass self
+            self._do_callback(self.callback, self.callback_args) # Callback not a bound method so pass self
 
     def _untouched(self):
-        self.lp = False
+        self.lpdelay.stop()
         if self.onrelease:
-            self.callback(self, *self.callback_args) # Callback not a bound method so pass self
+            self._do_callback(self.callback, self.callback_args) # Callback not a bound method so pass self
 
-    async def longpress(self):
-        self.lp = True
-        await asyncio.sleep_ms(self.long_press_time)
-        if self.lp:
-            self.lp_callback(self, *self.lp_args)
+    def longpress(self): # Long press timer has expired while still touched
+        self._do_callback(self.lp_callback, self.lp_args)
 
 # Group of buttons, typically at same location, where pressing one shows
 # the next e.g. start/stop toggle or sequential select from short list
@@ -726,6 +1738,7 @@ class ButtonList(object):
         active = self.current is None # 1st button added is active
         button.visible = active
         button.callback = self._callback
+        button._direct = True
         if active:
             self.current = button
         return button
@@ -739,7 +1752,7 @@ class ButtonList(object):
             old.show()
             new.visible = True
             new.show()
-            self.user_callback(new, *new.callback_args)
+            Screen.dispatch(self.user_callback, new, new.callback_args)
         return self.current
 
     def greyed_out(self, val=None):
@@ -760,7 +1773,7 @@ class ButtonList(object):
         new.visible = True
         new.busy = True # Don't respond to continued press
         new.show()
-        self.user_callback(new, *args) # user gets button with args they specified
+        Screen.dispatch(self.user_callback, new, args) # user gets button with args they specified
 
 # Group of buttons at different locations, where pressing one shows
 # only current button highlighted and oes callback from current one
@@ -777,6 +1790,7 @@ class RadioButtons(object):
         button = Button(*args, **kwargs)
         self.lstbuttons.append(button)
         button.callback = self._callback
+        button._direct = True
         active = len(self.lstbuttons) == self.selected + 1
         button.fgcolor = self.highlight if active else button.orig_fgcolor
         if active:
@@ -803,7 +1817,7 @@ class RadioButtons(object):
             else:
                 but.fgcolor = but.orig_fgcolor
             but.show()
-        self.user_callback(button, *args) # user gets button with args they specified
+        Screen.dispatch(self.user_callback, button, args) # user gets button with args they specified
 
 class Checkbox(Touchable):
     def __init__(self, location, *, height=30, fillcolor=None,
@@ -860,7 +1874,7 @@ class IconButton(Touchable):
         self.onrelease = onrelease
         self.lp_callback = lp_callback
         self.lp_args = lp_args
-        self.lp = False # Long press not in progress
+        self.lpdelay = Delay_ms(self.longpress) # Long press timer
         self.flash = int(flash * 1000)  # Compatibility
         self.toggle = toggle
         if state >= self.num_icons or state < 0:
@@ -892,7 +1906,7 @@ class IconButton(Touchable):
                 raise ugui_exception('Invalid icon index {}'.format(val))
             if val != self.state:
                 self._show(val)
-                self.callback(self, *self.callback_args) # Callback not a bound method so pass self
+                self._do_callback(self.callback, self.callback_args) # Callback not a bound method so pass self
         return self.state
 
     def _touched(self, x, y): # Process touch
@@ -903,21 +1917,17 @@ class IconButton(Touchable):
             self.state = (self.state + 1) % self.num_icons
             self._show(self.state)
         if self.lp_callback is not None:
-            loop = asyncio.get_event_loop()
-            loop.create_task(self.longpress())
+            self.lpdelay.trigger(self.long_press_time)
         if not self.onrelease:
-            self.callback(self, *self.callback_args) # Callback not a bound method so pass self
+            self._do_callback(self.callback, self.callback_args) # Callback not a bound method so pass self
 
     def _untouched(self):
-        self.lp = False
+        self.lpdelay.stop()
         if self.onrelease:
-            self.callback(self, *self.callback_args) # Callback not a bound method so pass self
+            self._do_callback(self.callback, self.callback_args) # Callback not a bound method so pass self
 
-    async def longpress(self):
-        self.lp = True
-        await asyncio.sleep_ms(self.long_press_time)
-        if self.lp:
-            self.lp_callback(self, *self.lp_args)
+    def longpress(self): # Long press timer has expired while still touched
+        self._do_callback(self.lp_callback, self.lp_args)
 
 # Group of buttons at different locations, where pressing one shows
 # only current button highlighted and does callback from current one
@@ -936,6 +1946,7 @@ class IconRadioButtons(object):
         button = IconButton(*args, **kwargs) # Create and show
         self.setbuttons.add(button)
         button.callback = self._callback
+        button._direct = True
         return button
 
     def value(self, but=None):
@@ -962,7 +1973,7 @@ class IconRadioButtons(object):
                 but._show(1)
             else:
                 but._show(0)
-        self.user_callback(button, *args) # Args for button just pressed
+        Screen.dispatch(self.user_callback, button, args) # Args for button just pressed
 
 # *********** SLIDER CLASSES ***********
 # A slider's text items lie outside its bounding box (area sensitive to touch)
@@ -989,38 +2000,42 @@ class Slider(Touchable):
         self.slide_x0 = xcentre - slidewidth // 2
         self.slide_x1 = xcentre + slidewidth // 2 # slide X coordinates
         self.slide_y = None # Invalidate slide position
+        # Static geometry
+        height = self.pot_dimension # Height of slot
+        x = self.location[0] + b
+        y = self.location[1] + b + self.slideheight // 2 # Allow space above and below slot
+        dx = width // 2 - 2
+        self._slot = (x + dx, y, x + width - dx, y + height)
+        self._tick_x = (x + 1, x + 2 + width // 2) # Add half slot width
+        self._tick_len = dx
+        self._ticks = array('h')
+        if divisions > 0:
+            dy = height / (divisions) # Tick marks
+            self._ticks = array('h', [int(y + dy * tick) for tick in range(divisions + 1)])
+        if self.legends is not None: # Legends are Label instances created once
+            if len(self.legends) <= 1:
+                dy = 0
+            else:
+                dy = height / (len(self.legends) -1)
+            yl = y + height # Start at bottom
+            fhdelta = self.font.height() / 2
+            for legend in self.legends:
+                loc = (x + self.width, int(yl - fhdelta))
+                Label(loc, font = font, fontcolor = self.fontcolor, value = legend)
+                yl -= dy
 
     def show(self):
         tft = self.tft
-        bw = self.border
-        width = self.width - 2 * bw
-        height = self.pot_dimension # Height of slot
-        x = self.location[0] + bw
-        y = self.location[1] + bw + self.slideheight // 2 # Allow space above and below slot
         if self._value is None or self.redraw: # Initialising
             self.redraw = False
             self.render_slide(tft, self.bgcolor) # Erase slide if it exists
-            dx = width // 2 - 2 
-            tft.draw_rectangle(x + dx, y, x + width - dx, y + height, self.fgcolor)
-            if self.divisions > 0:
-                dy = height / (self.divisions) # Tick marks
-                for tick in range(self.divisions + 1):
-                    ypos = int(y + dy * tick)
-                    tft.draw_hline(x + 1, ypos, dx, self.fgcolor)
-                    tft.draw_hline(x + 2 + width // 2, ypos, dx, self.fgcolor) # Add half slot width
-
-            if self.legends is not None: # Legends
-                if len(self.legends) <= 1:
-                    dy = 0
-                else:
-                    dy = height / (len(self.legends) -1)
-                yl = y + height # Start at bottom
-                fhdelta = self.font.height() / 2
-                font = self.font
-                for legend in self.legends:
-                    loc = (x + self.width, int(yl - fhdelta))
-                    Label(loc, font = font, fontcolor = self.fontcolor, value = legend)
-                    yl -= dy
+            xs, ys, xe, ye = self._slot
+            tft.draw_rectangle(xs, ys, xe, ye, self.fgcolor)
+            xl, xr = self._tick_x
+            dx = self._tick_len
+            for ypos in self._ticks:
+                tft.draw_hline(xl, ypos, dx, self.fgcolor)
+                tft.draw_hline(xr, ypos, dx, self.fgcolor)
             self.save_background(tft)
             if self._value is None:
                 self.value(self._initial_value, show = False) # Prevent recursion
@@ -1083,38 +2098,42 @@ class HorizSlider(Touchable):
         self.slide_y0 = ycentre - slideheight // 2
         self.slide_y1 = ycentre + slideheight // 2 # slide Y coordinates
         self.slide_x = None # invalidate: slide has not yet been drawn
+        # Static geometry
+        width = self.pot_dimension # Length of slot
+        x = self.location[0] + b + self.slidewidth // 2 # Allow space left and right slot for slider at extremes
+        y = self.location[1] + b
+        dy = height // 2 - 2 # slot is 4 pixels wide
+        self._slot = (x, y + dy, x + width, y + height - dy)
+        self._tick_y = (y + 1, y + 2 + height // 2) # TODO Why is +1 fiddle required here? Add half slot width
+        self._tick_len = dy
+        self._ticks = array('h')
+        if divisions > 0:
+            dx = width / (divisions) # Tick marks
+            self._ticks = array('h', [int(x + dx * tick) for tick in range(divisions + 1)])
+        if self.legends is not None: # Legends are Label instances created once
+            if len(self.legends) <= 1:
+                dx = 0
+            else:
+                dx = width / (len(self.legends) -1)
+            xl = x
+            for legend in self.legends:
+                offset = get_stringsize(legend, self.font)[0] / 2
+                loc = int(xl - offset), y - self.font.height() - b - 1
+                Label(loc, font = font, fontcolor = self.fontcolor, value = legend)
+                xl += dx
 
     def show(self):
         tft = self.tft
-        bw = self.border
-        height = self.height - 2 * bw
-        width = self.pot_dimension # Length of slot
-        x = self.location[0] + bw + self.slidewidth // 2 # Allow space left and right slot for slider at extremes
-        y = self.location[1] + bw
         if self._value is None or self.redraw: # Initialising
             self.redraw = False
             self.render_slide(tft, self.bgcolor) # Erase slide if it exists
-            dy = height // 2 - 2 # slot is 4 pixels wide
-            tft.draw_rectangle(x, y + dy, x + width, y + height - dy, self.fgcolor)
-            if self.divisions > 0:
-                dx = width / (self.divisions) # Tick marks
-                for tick in range(self.divisions + 1):
-                    xpos = int(x + dx * tick)
-                    tft.draw_vline(xpos, y + 1, dy, self.fgcolor) # TODO Why is +1 fiddle required here?
-                    tft.draw_vline(xpos, y + 2 + height // 2,  dy, self.fgcolor) # Add half slot width
-
-            if self.legends is not None: # Legends
-                if len(self.legends) <= 1:
-                    dx = 0
-                else:
-                    dx = width / (len(self.legends) -1)
-                xl = x
-                font = self.font
-                for legend in self.legends:
-                    offset = get_stringsize(legend, self.font)[0] / 2
-                    loc = int(xl - offset), y - self.font.height() - bw - 1
-                    Label(loc, font = font, fontcolor = self.fontcolor, value = legend)
-                    xl += dx
+            xs, ys, xe, ye = self._slot
+            tft.draw_rectangle(xs, ys, xe, ye, self.fgcolor)
+            yt, yb = self._tick_y
+            dy = self._tick_len
+            for xpos in self._ticks:
+                tft.draw_vline(xpos, yt, dy, self.fgcolor)
+                tft.draw_vline(xpos, yb, dy, self.fgcolor)
             self.save_background(tft)
             if self._value is None:
                 self.value(self._initial_value, show = False) # prevent recursion
@@ -1175,22 +2194,28 @@ class Knob(Touchable):
         super()._set_callbacks(cb_move, cbm_args, cb_end, cbe_args)
         self._old_value = None # data: invalidate
         self.color = color
+        # Static geometry: start and end coordinates of each tick
+        arc = self.arc
+        ticks = self.ticks
+        ticklen = self.ticklen
+        coords = []
+        for tick in range(ticks):
+            theta = (tick / (ticks - 1)) * arc - arc / 2
+            coords.append(int(self.xorigin + radius * math.sin(theta)))
+            coords.append(int(self.yorigin - radius * math.cos(theta)))
+            coords.append(int(self.xorigin + (radius - ticklen) * math.sin(theta)))
+            coords.append(int(self.yorigin - (radius - ticklen) * math.cos(theta)))
+        self._ticks = array('h', coords)
 
     def show(self):
         tft = self.tft
         if self._value is None or self.redraw: # Initialising
             self.redraw = False
-            arc = self.arc
-            ticks = self.ticks
             radius = self.radius
             ticklen = self.ticklen
-            for tick in range(ticks):
-                theta = (tick / (ticks - 1)) * arc - arc / 2
-                x_start = int(self.xorigin + radius * math.sin(theta))
-                y_start = int(self.yorigin - radius * math.cos(theta))
-                x_end = int(self.xorigin + (radius - ticklen) * math.sin(theta))
-                y_end = int(self.yorigin - (radius - ticklen) * math.cos(theta))
-                tft.draw_line(x_start, y_start, x_end, y_end, self.fgcolor)
+            t = self._ticks
+            for n in range(0, len(t), 4):
+                tft.draw_line(t[n], t[n + 1], t[n + 2], t[n + 3], self.fgcolor)
             if self.color is not None:
                 tft.fill_circle(self.xorigin, self.yorigin, radius - ticklen, self.color)
             tft.draw_circle(self.xorigin, self.yorigin, radius - ticklen, self.fgcolor)
@@ -1231,63 +2256,183 @@ class Knob(Touchable):
 
 # *********** LISTBOX CLASS ***********
 
+# A Listbox with more elements than nrows is virtualised: only nrows rows are
+# displayed and the list is scrolled by dragging or by the scroll() method.
+# On scrolling, rows still in view are moved by copying pixels on the display
+# so only newly exposed rows are rendered. Elements may be a list or tuple of
+# strings, any object supporting len() and indexing, or a callback which takes
+# an index and returns a string (in which case nelements must be provided).
 class Listbox(Touchable):
     def __init__(self, location, *, font, elements, width=250, value=0, border=2,
                  fgcolor=None, bgcolor=None, fontcolor=None, select_color=LIGHTBLUE,
-                 callback=dolittle, args=[]):
+                 callback=dolittle, args=[], nrows=None, nelements=None):
         self.entry_height = font.height() + 2 # Allow a pixel above and below text
         bw = border if border is not None else 0 # Replicate Touchable ctor's handling of self.border
-        height = self.entry_height * len(elements) + 2 * bw
-        super().__init__(location, font, height, width, fgcolor, bgcolor, fontcolor, border, False, value, None)
-        super()._set_callbacks(callback, args)
-        self.select_color = select_color
         fail = False
-        try:
-            self.elements = [s for s in elements if type(s) is str]
-        except:
-            fail = True
+        self._source = None
+        if callable(elements):
+            self._source = elements
+            self.elements = None
+            fail = nelements is None or nelements < 1
         else:
-            fail = len(self.elements) == 0
+            try:
+                if isinstance(elements, (list, tuple)):
+                    self.elements = [s for s in elements if type(s) is str]
+                else: # Lazy sequence
+                    self.elements = elements
+                nelements = len(self.elements)
+            except:
+                fail = True
+            else:
+                fail = nelements == 0
         if fail:
             raise ValueError('elements must be a list or tuple of one or more strings')
-        if value >= len(self.elements):
+        self._nelements = nelements
+        self.nrows = nelements if nrows is None else max(min(nrows, nelements), 1)
+        self._virtual = self.nrows < nelements
+        height = self.entry_height * self.nrows + 2 * bw
+        super().__init__(location, font, height, width, fgcolor, bgcolor, fontcolor, border, self._virtual, value, None)
+        super()._set_callbacks(callback, args)
+        self.select_color = select_color
+        if value >= nelements:
             value = 0
         self._value = value # No callback until user touches
+        self._shown_value = value # Element highlighted on the display
+        self._offset = max(min(value, nelements - self.nrows), 0) # First visible element
+        self._drag_y = None # Touch state
+        self._dragged = False
+        self._linebuf = None # Allocated on first scroll
+
+    def _element(self, n):
+        if self._source is not None:
+            return self._source(n)
+        return self.elements[n]
+
+    def _draw_row(self, tft, row, clear): # Draw row of viewport
+        style = self.style
+        bw = style.border
+        n = self._offset + row
+        xs = self.location[0] + bw # start and end of text field
+        xe = self.location[0] + self.width - 2 * bw
+        ye = self.location[1] + row * self.entry_height
+        if n == self._value:
+            tft.fill_rectangle(xs, ye + 1, xe, ye + self.entry_height - 1, self.select_color)
+        elif clear:
+            tft.fill_rectangle(xs, ye + 1, xe, ye + self.entry_height - 1, style.bgcolor)
+        if n < self._nelements:
+            print_left(tft, xs, ye + 1, self._element(n), style.fontcolor, style.font, self.width - 2 * bw)
 
     def show(self):
+        style = self.style
         tft = self.tft
-        bw = self.border
-        clip = self.width - 2 * bw
-        length = len(self.elements)
+        bw = style.border
         x = self.location[0]
         y = self.location[1]
         xs = x + bw # start and end of text field
         xe = x + self.width - 2 * bw
-        tft.fill_rectangle(xs, y + 1, xe, y - 1 + self.height - 2 * bw, self.bgcolor)
-        for n in range(length):
-            ye = y + n * self.entry_height
-            if n == self._value:
-                tft.fill_rectangle(xs, ye + 1, xe, ye + self.entry_height - 1, self.select_color)
-            print_left(tft, xs, ye + 1, self.elements[n], self.fontcolor, self.font, clip)
+        tft.fill_rectangle(xs, y + 1, xe, y - 1 + self.height - 2 * bw, style.bgcolor)
+        for row in range(self.nrows):
+            self._draw_row(tft, row, False)
+        self._shown_value = self._value
+
+# A change of selection redraws only the previously and newly selected rows. A
+# selection outside the visible rows is first scrolled into view.
+    def _value_change(self, show):
+        self._do_callback(self.callback, self.args, True) # CB is not a bound method. 1st arg is self
+        if not show:
+            return
+        n = self._value
+        offset = self._offset
+        if 0 <= n < self._nelements and not offset <= n < offset + self.nrows:
+            offset = n if n < offset else n - self.nrows + 1 # Minimum scroll
+            if self.screen is Screen.current_screen:
+                self._scroll_to(offset)
+            else:
+                self._offset = max(min(offset, self._nelements - self.nrows), 0)
+        if self.screen is not Screen.current_screen:
+            self._hidden_change = True
+            return
+        tft = self.tft
+        old = self._shown_value
+        self._shown_value = self._value
+        for n in (old, self._value) if old != self._value else (old,):
+            row = n - self._offset
+            if 0 <= row < self.nrows:
+                self._draw_row(tft, row, True)
+
+    def offset(self): # Index of first visible element
+        return self._offset
+
+    def scroll(self, nrows): # Scroll by nrows: +ve reveals later elements
+        self._scroll_to(self._offset + nrows)
+
+    def _scroll_to(self, offset):
+        offset = max(min(offset, self._nelements - self.nrows), 0)
+        delta = offset - self._offset
+        if delta == 0:
+            return
+        self._offset = offset
+        if self.screen is not Screen.current_screen:
+            self._hidden_change = True
+            return
+        tft = self.tft
+        if abs(delta) >= self.nrows:
+            self.show()
+            return
+        # Move rows still in view one pixel line at a time
+        bw = self.border
+        xs = self.location[0] + bw
+        w = self.width - 3 * bw + 1
+        if self._linebuf is None:
+            self._linebuf = bytearray(w * 3)
+        buf = self._linebuf
+        eh = self.entry_height
+        y = self.location[1]
+        k = abs(delta)
+        nlines = (self.nrows - k) * eh
+        lines = range(nlines) if delta > 0 else range(nlines - 1, -1, -1)
+        src, dst = (y + k * eh, y) if delta > 0 else (y, y + k * eh)
+        for line in lines:
+            tft.readBitmap(xs, src + line, w, 1, buf)
+            tft.writeBitmap(xs, dst + line, w, 1, buf)
+        rows = range(self.nrows - k, self.nrows) if delta > 0 else range(k)
+        for row in rows:
+            self._draw_row(tft, row, True)
 
     def textvalue(self, text=None): # if no arg return current text
         if text is None:
-            return self.elements[self._value]
+            return self._element(self._value)
         else: # set value by text
-            try:
-                v = self.elements.index(text)
-            except ValueError:
-                v = None
-            else:
-                if v != self._value:
-                    self.value(v)
+            v = None
+            for n in range(self._nelements):
+                if self._element(n) == text:
+                    v = n
+                    break
+            if v is not None and v != self._value:
+                self.value(v)
             return v
 
     def _touched(self, x, y):
-        dy = y - (self.location[1])
-        self._initial_value = dy // self.entry_height
+        if self._drag_y is None: # Initial touch
+            dy = y - (self.location[1])
+            self._initial_value = self._offset + dy // self.entry_height
+            if self._initial_value >= self._nelements:
+                self._initial_value = None
+            if self._virtual:
+                self._drag_y = y
+                self._drag_offset = self._offset
+                self._dragged = False
+        else: # Dragging a virtualised list
+            rows = int((self._drag_y - y) / self.entry_height)
+            if rows:
+                self._dragged = True
+                self._scroll_to(self._drag_offset + rows)
 
     def _untouched(self):
+        self._drag_y = None
+        if self._dragged: # Scrolled: no selection
+            self._dragged = False
+            self._initial_value = None
         if self._initial_value is not None:
             self._value = -1  # Force update on every touch
             self.value(self._initial_value, show = True)
@@ -1296,7 +2441,7 @@ class Listbox(Touchable):
 # *********** DROPDOWN LIST CLASS ***********
 
 class _ListDialog(Aperture):
-    def __init__(self, location, dropdown, width):
+    def __init__(self, location, dropdown, width, save_under=False):
         border = 1 # between Aperture border and list
         dd = dropdown
         font = dd.font
@@ -1305,11 +2450,12 @@ class _ListDialog(Aperture):
         height = entry_height * len(elements) + 2 * border
         lb_location = location[0] + border, location[1] + border
         lb_width = width - 2 * border
-        super().__init__(location, height, width)
+        super().__init__(location, height, width, save_under = save_under)
         self.listbox = Listbox(lb_location, font = font, elements = elements, width = lb_width,
                                border = None, fgcolor = dd.fgcolor, bgcolor = dd.bgcolor,
                                fontcolor = dd.fontcolor, select_color = dd.select_color,
                                value = dd.value(), callback = self.callback)
+        self.listbox._direct = True # callback tests the touch state
         self.dropdown = dd
 
     def callback(self, obj_listbox):
@@ -1322,7 +2468,7 @@ class _ListDialog(Aperture):
 class Dropdown(Touchable):
     def __init__(self, location, *, font, elements, width=250, value=0,
                  fgcolor=None, bgcolor=None, fontcolor=None, select_color=LIGHTBLUE,
-                 callback=dolittle, args=[]):
+                 callback=dolittle, args=[], save_under=False):
         border = 2
         self.entry_height = font.height() + 2 # Allow a pixel above and below text
         height = self.entry_height + 2 * border
@@ -1330,6 +2476,7 @@ class Dropdown(Touchable):
         super()._set_callbacks(callback, args)
         self.select_color = select_color
         self.elements = elements
+        self.save_under = save_under
 
     def show(self):
         tft = self.tft
@@ -1369,7 +2516,7 @@ class Dropdown(Touchable):
     def _touched(self, x, y):
         if len(self.elements) > 1:
             location = self.location[0], self.location[1] + self.height + 1
-            args = (location, self, self.width - self.height)
+            args = (location, self, self.width - self.height, self.save_under)
             Screen.change(_ListDialog, args = args)
 
 # *********** DIALOG BOX CLASS ***********
@@ -1377,7 +2524,7 @@ class Dropdown(Touchable):
 
 class DialogBox(Aperture):
     def __init__(self, font, *, elements, location=(20, 20), label=None,
-                 bgcolor=DARKGREEN, buttonwidth=25, closebutton=True):
+                 bgcolor=DARKGREEN, buttonwidth=25, closebutton=True, save_under=False):
         height = 150
         spacing = 20
         buttonwidth = max(max([get_stringsize(x[0], font)[0] for x in elements]) + 4, buttonwidth)
@@ -1386,7 +2533,7 @@ class DialogBox(Aperture):
         width = spacing + (buttonwidth + spacing) * nelements
         if label is not None:
             width = max(width, get_stringsize(label, font)[0] + 2 * spacing)
-        super().__init__(location, height, width, bgcolor = bgcolor)
+        super().__init__(location, height, width, bgcolor = bgcolor, save_under = save_under)
         x = self.location[0] + spacing # Coordinates relative to physical display
         gap = 0
         if nelements > 1:
@@ -1395,16 +2542,18 @@ class DialogBox(Aperture):
         if label is not None:
             Label((x, self.location[1] + 50), font = font, value = label)
         for text, color in elements:
-            Button((x, y), height = buttonheight, width = buttonwidth, font = font, fontcolor = BLACK, fgcolor = color,
+            button = Button((x, y), height = buttonheight, width = buttonwidth, font = font, fontcolor = BLACK, fgcolor = color,
                 text = text, shape = RECTANGLE,
                 callback = self.back, args = (text,))
+            button._direct = True
             x += buttonwidth + gap
         if closebutton:
             x, y = get_stringsize('X', font)
             size = max(x, y, 25)
-            Button((self.location[0] + width - (size + 1), self.location[1] + 1), height = size, width = size, font = font,
+            button = Button((self.location[0] + width - (size + 1), self.location[1] + 1), height = size, width = size, font = font,
                 fgcolor = RED,  text = 'X', shape = RECTANGLE,
                 callback = self.back, args = ('Close',))
+            button._direct = True
 
     def back(self, button, text):
         Aperture.value(text)